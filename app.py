@@ -1,27 +1,32 @@
 import streamlit as st
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
 from loguru import logger
 from llm_processor import LLMProcessor
 from text_processor import TextProcessor
+from editing_processor import MAX_CONCURRENT_REQUESTS
 
 # 配置日志
 logger.remove()  # 移除默认处理器
 logger.add(
     "logs/app_{time:YYYY-MM-DD}.log",
-    rotation="1 day",
+    rotation="00:00",  # 每天零点切换文件，文件名日期与内容一致
     retention="30 days",
     format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
-    level="INFO"
+    level="INFO",
+    enqueue=True,  # 由后台线程统一写盘，避免阻塞处理流程
+    buffering=1 << 16
 )
 # 添加控制台日志输出
 logger.add(
     lambda msg: print(msg, end=""),
     format="{time:HH:mm:ss} | {level} | {message}",
     level="INFO",
-    colorize=True
+    colorize=True,
+    enqueue=True
 )
 
 # 加载环境变量
@@ -30,12 +35,22 @@ load_dotenv()
 # 配置缓存文件路径
 CONFIG_CACHE_FILE = "config_cache.json"
 
+# 结果文件写入缓冲区大小，保证整份结果一次写盘
+RESULT_FILE_BUFFERING = 1 << 20
+
+@st.cache_data(show_spinner=False)
+def _load_cached_config_impl(path, mtime):
+    """读取配置文件，mtime 参与缓存键，文件未变化时直接返回缓存结果"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 def load_cached_config():
     """加载缓存的配置"""
     try:
-        if os.path.exists(CONFIG_CACHE_FILE):
-            with open(CONFIG_CACHE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        mtime = os.stat(CONFIG_CACHE_FILE).st_mtime
+        return _load_cached_config_impl(CONFIG_CACHE_FILE, mtime)
+    except FileNotFoundError:
+        pass
     except Exception as e:
         logger.warning(f"加载配置缓存失败: {e}")
     return {}
@@ -55,6 +70,16 @@ def save_config_cache(api_key, base_url, model):
     except Exception as e:
         logger.error(f"保存配置缓存失败: {e}")
 
+@st.cache_resource(show_spinner=False)
+def get_llm_processor(api_key, base_url, model):
+    """获取缓存的LLM处理器，相同配置在多次重跑间复用同一个客户端及其连接池"""
+    return LLMProcessor(api_key, base_url, model)
+
+@st.cache_resource(show_spinner=False)
+def get_text_processor(chunk_size, overlap_size):
+    """获取缓存的文本处理器"""
+    return TextProcessor(chunk_size, overlap_size)
+
 def main():
     st.set_page_config(
         page_title="录音文字校对助手",
@@ -111,6 +136,10 @@ def main():
         st.subheader("处理参数")
         chunk_size = st.slider("分段大小（字符数）", 500, 3000, 1500)
         overlap_size = st.slider("重叠大小（字符数）", 50, 300, 100)
+        use_cache = st.checkbox(
+            "复用缓存的AI结果", value=True,
+            help="相同的输入和参数在一小时内直接返回上次的校对或扩展结果；取消勾选则重新生成"
+        )
         
 
     
@@ -147,8 +176,8 @@ def main():
             if domain_knowledge.strip() and api_key:
                 with st.spinner("正在扩展领域知识..."):
                     try:
-                        processor = LLMProcessor(api_key, base_url, model)
-                        expanded_domain = processor.expand_domain_knowledge(domain_knowledge)
+                        processor = get_llm_processor(api_key, base_url, model)
+                        expanded_domain = processor.expand_domain_knowledge(domain_knowledge, use_cache)
                         st.session_state.expanded_domain_knowledge = expanded_domain
                         st.success("领域知识扩展完成！")
                     except Exception as e:
@@ -168,10 +197,10 @@ def main():
             if keywords.strip() and api_key:
                 with st.spinner("正在扩展关键字..."):
                     try:
-                        processor = LLMProcessor(api_key, base_url, model)
+                        processor = get_llm_processor(api_key, base_url, model)
                         # 使用扩展后的领域知识（如果有的话）
                         reference_domain = st.session_state.get('expanded_domain_knowledge', domain_knowledge)
-                        expanded_keywords = processor.expand_keywords(keywords, reference_domain)
+                        expanded_keywords = processor.expand_keywords(keywords, reference_domain, use_cache)
                         st.session_state.expanded_keywords = expanded_keywords
                         st.success("关键字扩展完成！")
                     except Exception as e:
@@ -191,7 +220,7 @@ def main():
         # 获取输入文本
         input_text = ""
         if uploaded_file is not None:
-            input_text = uploaded_file.read().decode('utf-8')
+            input_text = uploaded_file.getvalue().decode('utf-8')
             logger.info(f"上传文件，文本长度: {len(input_text)} 字符")
         elif text_input:
             input_text = text_input
@@ -204,7 +233,7 @@ def main():
             
             # 根据处理模式调用不同的函数
             if processing_mode == "完整校对模式":
-                process_text(input_text, final_domain_knowledge, final_keywords, api_key, base_url, model, chunk_size, overlap_size)
+                process_text(input_text, final_domain_knowledge, final_keywords, api_key, base_url, model, chunk_size, overlap_size, use_cache)
             else:
                 process_direct_edit(input_text, final_domain_knowledge, final_keywords, api_key, base_url, model)
         else:
@@ -217,6 +246,11 @@ def main():
     # 结果区域（下半部分）
     st.header("📋 处理结果")
     
+    render_results()
+
+@st.fragment
+def render_results():
+    """渲染处理结果区域；作为片段运行，区域内的交互只重跑本函数"""
     # 显示处理结果的标签页
     if 'basic_result' in st.session_state or 'edited_result' in st.session_state:
         tab1, tab2, tab3 = st.tabs(["基础校对版本", "编辑整理版本", "对比查看"])
@@ -290,16 +324,16 @@ def main():
     else:
         st.info("请在上方输入录音文字并点击\"开始校对\"按钮")
 
-def process_text(input_text, domain_knowledge, keywords, api_key, base_url, model, chunk_size, overlap_size):
+def process_text(input_text, domain_knowledge, keywords, api_key, base_url, model, chunk_size, overlap_size, use_cache=True):
     """处理文本的主要函数"""
     try:
         logger.info(f"开始处理文本，使用模型: {model}")
         logger.info(f"领域知识: {domain_knowledge}")
         logger.info(f"关键字: {keywords}")
         
-        # 初始化处理器
-        llm_processor = LLMProcessor(api_key, base_url, model)
-        text_processor = TextProcessor(chunk_size, overlap_size)
+        # 获取处理器（按配置缓存复用）
+        llm_processor = get_llm_processor(api_key, base_url, model)
+        text_processor = get_text_processor(chunk_size, overlap_size)
         
         # 显示进度
         progress_container = st.container()
@@ -307,6 +341,7 @@ def process_text(input_text, domain_knowledge, keywords, api_key, base_url, mode
             progress_bar = st.progress(0)
             status_text = st.empty()
             progress_text = st.empty()
+            stream_preview = st.empty()
         
         # 第一步：基础校对
         status_text.text("正在进行基础校对...")
@@ -317,16 +352,32 @@ def process_text(input_text, domain_knowledge, keywords, api_key, base_url, mode
         total_chunks = len(chunks)
         logger.info(f"文本分为 {total_chunks} 个段落")
         
-        basic_results = []
-        
-        for i, chunk in enumerate(chunks):
-            current_progress = 25 + (i * 50 // total_chunks)
-            progress_bar.progress(current_progress)
-            progress_text.text(f"基础校对进度: {i+1}/{total_chunks}")
-            
-            logger.info(f"处理第 {i+1}/{total_chunks} 个段落")
-            chunk_result = llm_processor.basic_proofread(chunk, domain_knowledge, keywords)
-            basic_results.append(chunk_result)
+        basic_results = [None] * total_chunks
+        completed = 0
+        progress_bar.progress(25)
+        progress_text.text(f"基础校对进度: 0/{total_chunks}")
+        
+        # 各段落互相独立，并发请求LLM；进度在主线程中按完成顺序更新
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            futures = {
+                executor.submit(llm_processor.basic_proofread, chunk, domain_knowledge, keywords, use_cache): i
+                for i, chunk in enumerate(chunks)
+            }
+            try:
+                for future in as_completed(futures):
+                    i = futures[future]
+                    basic_results[i] = future.result()
+                    completed += 1
+                    
+                    progress_bar.progress(25 + (completed * 50 // total_chunks))
+                    progress_text.text(f"基础校对进度: {completed}/{total_chunks}")
+                    logger.debug(f"第 {i+1}/{total_chunks} 个段落校对完成")
+            except Exception:
+                # 任一段落失败时取消尚未开始的请求
+                for pending in futures:
+                    pending.cancel()
+                raise
+        logger.info(f"基础校对完成，共处理 {total_chunks} 个段落")
         
         # 合并基础校对结果
         basic_result = text_processor.merge_results(basic_results)
@@ -334,7 +385,7 @@ def process_text(input_text, domain_knowledge, keywords, api_key, base_url, mode
         
         # 保存基础校对结果到文件
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        with open(f"logs/basic_proofread_{timestamp}.md", "w", encoding="utf-8") as f:
+        with open(f"logs/basic_proofread_{timestamp}.md", "w", encoding="utf-8", buffering=RESULT_FILE_BUFFERING) as f:
             f.write(basic_result)
         logger.info(f"基础校对结果已保存到: logs/basic_proofread_{timestamp}.md")
         
@@ -344,11 +395,14 @@ def process_text(input_text, domain_knowledge, keywords, api_key, base_url, mode
         progress_bar.progress(75)
         logger.info("开始编辑整理阶段")
         
-        edited_result = llm_processor.edit_and_organize(basic_result, domain_knowledge, keywords)
+        edited_result = llm_processor.edit_and_organize(
+            basic_result, domain_knowledge, keywords, on_progress=stream_preview.markdown
+        )
+        stream_preview.empty()
         st.session_state.edited_result = edited_result
         
         # 保存编辑整理结果到文件
-        with open(f"logs/edited_version_{timestamp}.md", "w", encoding="utf-8") as f:
+        with open(f"logs/edited_version_{timestamp}.md", "w", encoding="utf-8", buffering=RESULT_FILE_BUFFERING) as f:
             f.write(edited_result)
         logger.info(f"编辑整理结果已保存到: logs/edited_version_{timestamp}.md")
         
@@ -371,8 +425,8 @@ def process_direct_edit(input_text, domain_knowledge, keywords, api_key, base_ur
         logger.info(f"领域知识: {domain_knowledge}")
         logger.info(f"关键字: {keywords}")
         
-        # 初始化处理器
-        llm_processor = LLMProcessor(api_key, base_url, model)
+        # 获取处理器（按配置缓存复用）
+        llm_processor = get_llm_processor(api_key, base_url, model)
         
         # 显示进度
         progress_container = st.container()
@@ -380,6 +434,7 @@ def process_direct_edit(input_text, domain_knowledge, keywords, api_key, base_ur
             progress_bar = st.progress(0)
             status_text = st.empty()
             progress_text = st.empty()
+            stream_preview = st.empty()
         
         # 直接进行编辑整理
         status_text.text("正在进行编辑整理...")
@@ -391,12 +446,15 @@ def process_direct_edit(input_text, domain_knowledge, keywords, api_key, base_ur
         st.session_state.basic_result = input_text
         
         # 直接调用编辑整理功能
-        edited_result = llm_processor.edit_and_organize(input_text, domain_knowledge, keywords)
+        edited_result = llm_processor.edit_and_organize(
+            input_text, domain_knowledge, keywords, on_progress=stream_preview.markdown
+        )
+        stream_preview.empty()
         st.session_state.edited_result = edited_result
         
         # 保存结果到文件
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        with open(f"logs/direct_edit_{timestamp}.md", "w", encoding="utf-8") as f:
+        with open(f"logs/direct_edit_{timestamp}.md", "w", encoding="utf-8", buffering=RESULT_FILE_BUFFERING) as f:
             f.write(edited_result)
         logger.info(f"直接编辑结果已保存到: logs/direct_edit_{timestamp}.md")
         
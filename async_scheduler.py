@@ -0,0 +1,249 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+import openai
+from loguru import logger
+
+# 默认限流参数，按账号的每分钟请求数/Token数配额调整
+MAX_REQUESTS_PER_MINUTE = 300
+MAX_TOKENS_PER_MINUTE = 300000
+
+# 单个请求的最大尝试次数
+MAX_ATTEMPTS = 5
+
+# 触发限流后所有请求暂停的秒数
+RATE_LIMIT_COOLDOWN_SECONDS = 15
+
+# 需要退避重试的异常（APITimeoutError 是 APIConnectionError 的子类）；
+# 客户端均关闭了SDK自带的重试（max_retries=0），重试只在这里进行，服务端5xx错误也需包含在内
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+# 同步请求重试的最长等待秒数
+RETRY_MAX_WAIT_SECONDS = 30
+
+T = TypeVar('T')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的Token数（中文约一字一Token），用于限流计算"""
+    return len(text)
+
+
+def estimate_messages_tokens(messages: List[Dict]) -> int:
+    """估算对话消息列表的Token数"""
+    return sum(estimate_tokens(message["content"]) for message in messages)
+
+
+class RateLimiter:
+    """
+    按每分钟请求数和Token数限流的共享令牌桶，线程安全
+
+    同一个API账号的所有请求应共用一个实例：各线程的同步请求和各事件循环中的调度器都从这里
+    扣除容量，任一请求触发限流后所有请求一同暂停。
+    """
+
+    def __init__(self, max_requests_per_minute: int = MAX_REQUESTS_PER_MINUTE,
+                 max_tokens_per_minute: int = MAX_TOKENS_PER_MINUTE):
+        """
+        初始化限流器
+
+        Args:
+            max_requests_per_minute: 每分钟最大请求数
+            max_tokens_per_minute: 每分钟最大Token数
+        """
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+
+        # 漏桶容量，按流逝时间匀速补充
+        self.available_request_capacity = float(max_requests_per_minute)
+        self.available_token_capacity = float(max_tokens_per_minute)
+        self._last_update_time = time.monotonic()
+        self.time_of_last_rate_limit_error: Optional[float] = None
+
+        self._lock = threading.Lock()
+
+    def _refill_capacity(self):
+        """按距上次更新的时间补充请求和Token容量，调用方需持有锁"""
+        now = time.monotonic()
+        elapsed = now - self._last_update_time
+        self.available_request_capacity = min(
+            self.available_request_capacity + self.max_requests_per_minute * elapsed / 60,
+            self.max_requests_per_minute
+        )
+        self.available_token_capacity = min(
+            self.available_token_capacity + self.max_tokens_per_minute * elapsed / 60,
+            self.max_tokens_per_minute
+        )
+        self._last_update_time = now
+
+    def try_acquire(self, token_cost: int) -> float:
+        """
+        尝试扣除一次请求的容量
+
+        Args:
+            token_cost: 本次请求预计消耗的Token数
+
+        Returns:
+            扣除成功时返回0，否则返回建议等待的秒数
+        """
+        # 单个请求超过每分钟上限时按上限计，避免永远等待
+        token_cost = min(token_cost, self.max_tokens_per_minute)
+
+        with self._lock:
+            # 刚触发过限流时整体暂停，避免重试风暴
+            if self.time_of_last_rate_limit_error is not None:
+                cooldown = self.time_of_last_rate_limit_error + RATE_LIMIT_COOLDOWN_SECONDS - time.monotonic()
+                if cooldown > 0:
+                    return cooldown
+
+            self._refill_capacity()
+            if (self.available_request_capacity >= 1
+                    and self.available_token_capacity >= token_cost):
+                self.available_request_capacity -= 1
+                self.available_token_capacity -= token_cost
+                return 0
+
+            # 等待到容量补足所需的时间
+            return max(
+                (1 - self.available_request_capacity) * 60 / self.max_requests_per_minute,
+                (token_cost - self.available_token_capacity) * 60 / self.max_tokens_per_minute,
+                0.01
+            )
+
+    def acquire(self, token_cost: int):
+        """阻塞当前线程直到扣除容量，用于同步请求"""
+        while True:
+            wait_seconds = self.try_acquire(token_cost)
+            if not wait_seconds:
+                return
+            time.sleep(wait_seconds)
+
+    def record_rate_limit_error(self):
+        """记录一次限流错误，随后的请求整体暂停"""
+        with self._lock:
+            self.time_of_last_rate_limit_error = time.monotonic()
+
+
+def call_with_retry(request: Callable[[], T], max_attempts: int = MAX_ATTEMPTS,
+                    max_wait: float = RETRY_MAX_WAIT_SECONDS,
+                    limiter: Optional[RateLimiter] = None, token_cost: int = 0) -> T:
+    """
+    执行同步请求，限流或连接错误时按随机化的指数退避重试，其余异常直接抛出
+
+    Args:
+        request: 无参数的请求函数，每次尝试调用一次
+        max_attempts: 最大尝试次数
+        max_wait: 单次等待的上限（秒）
+        limiter: 共享限流器，提供时每次尝试前先扣除容量
+        token_cost: 本次请求预计消耗的Token数
+
+    Returns:
+        请求结果
+    """
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None:
+            limiter.acquire(token_cost)
+        try:
+            return request()
+        except RETRYABLE_ERRORS as e:
+            if limiter is not None and isinstance(e, openai.RateLimitError):
+                limiter.record_rate_limit_error()
+            if attempt == max_attempts:
+                raise
+            # 在 [0, 2^attempt] 内随机等待，避免多个请求同时重试
+            delay = random.uniform(0, min(max_wait, 2 ** attempt))
+            logger.warning(f"请求失败（第 {attempt}/{max_attempts} 次）: {e}，{delay:.1f} 秒后重试")
+            time.sleep(delay)
+
+
+class StatusTracker:
+    """记录调度器的请求状态"""
+
+    def __init__(self):
+        self.num_tasks_started = 0
+        self.num_tasks_in_progress = 0
+        self.num_tasks_succeeded = 0
+        self.num_tasks_failed = 0
+        self.num_rate_limit_errors = 0
+        self.num_api_errors = 0
+
+    def summary(self) -> str:
+        """生成状态摘要"""
+        return (f"成功 {self.num_tasks_succeeded}，失败 {self.num_tasks_failed}，"
+                f"限流 {self.num_rate_limit_errors} 次，连接错误 {self.num_api_errors} 次")
+
+
+class RequestScheduler:
+    """在共享限流器的配额内并发执行一个事件循环中的请求"""
+
+    def __init__(self, limiter: Optional[RateLimiter] = None,
+                 max_attempts: int = MAX_ATTEMPTS, max_concurrency: int = 8):
+        """
+        初始化调度器，需在运行中的事件循环内创建并只在该循环中使用
+
+        Args:
+            limiter: 共享限流器，应用内应传入同一个实例；未提供时创建只作用于本调度器的限流器
+            max_attempts: 单个请求的最大尝试次数
+            max_concurrency: 同时进行中的请求数上限
+        """
+        self.limiter = limiter or RateLimiter()
+        self.max_attempts = max_attempts
+        self.status = StatusTracker()
+
+        # 本循环内的请求按先后顺序等待容量，避免大请求一直等不到
+        self._capacity_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _acquire_capacity(self, token_cost: int):
+        """等待直到共享限流器中有足够的请求和Token容量，并扣除本次消耗"""
+        async with self._capacity_lock:
+            while True:
+                wait_seconds = self.limiter.try_acquire(token_cost)
+                if not wait_seconds:
+                    return
+                await asyncio.sleep(wait_seconds)
+
+    async def submit(self, request: Callable[[], Awaitable[T]], token_cost: int) -> T:
+        """
+        在限流和并发上限内执行请求，限流或连接错误时指数退避重试
+
+        Args:
+            request: 无参数的协程函数，每次尝试调用一次
+            token_cost: 本次请求预计消耗的Token数
+
+        Returns:
+            请求结果
+        """
+        self.status.num_tasks_started += 1
+
+        async with self._semaphore:
+            self.status.num_tasks_in_progress += 1
+            try:
+                for attempt in range(1, self.max_attempts + 1):
+                    await self._acquire_capacity(token_cost)
+                    try:
+                        result = await request()
+                    except RETRYABLE_ERRORS as e:
+                        if isinstance(e, openai.RateLimitError):
+                            self.status.num_rate_limit_errors += 1
+                            self.limiter.record_rate_limit_error()
+                        else:
+                            self.status.num_api_errors += 1
+
+                        if attempt == self.max_attempts:
+                            self.status.num_tasks_failed += 1
+                            raise
+
+                        delay = 2 ** attempt + random.random()
+                        logger.warning(f"请求失败（第 {attempt}/{self.max_attempts} 次）: {e}，{delay:.1f} 秒后重试")
+                        await asyncio.sleep(delay)
+                    except Exception:
+                        self.status.num_tasks_failed += 1
+                        raise
+                    else:
+                        self.status.num_tasks_succeeded += 1
+                        return result
+            finally:
+                self.status.num_tasks_in_progress -= 1
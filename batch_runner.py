@@ -0,0 +1,119 @@
+import json
+import time
+from typing import Dict, List, Tuple
+import openai
+from loguru import logger
+
+# 批处理任务使用的接口与完成时限
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+
+# 默认轮询间隔（秒）
+DEFAULT_POLL_INTERVAL = 30
+
+# 批处理任务的终止状态
+_TERMINAL_STATUSES = frozenset(("completed", "failed", "expired", "cancelled"))
+
+
+class BatchRunner:
+    """通过OpenAI Batch API异步执行大批量对话请求，费用减半且不占用实时请求的限流配额"""
+
+    def __init__(self, client: openai.OpenAI, model: str, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        初始化批处理执行器
+
+        Args:
+            client: 同步OpenAI客户端
+            model: 使用的模型名称
+            poll_interval: 查询批处理状态的间隔（秒）
+        """
+        self.client = client
+        self.model = model
+        self.poll_interval = poll_interval
+
+    def run(self, requests: List[Tuple[str, List[Dict], float]]) -> Dict[str, str]:
+        """
+        提交一批请求并等待全部完成
+
+        Args:
+            requests: (custom_id, 消息列表, 采样温度) 的列表，custom_id 在批内必须唯一
+
+        Returns:
+            custom_id 到输出文本的映射
+        """
+        if not requests:
+            return {}
+
+        input_file = self.client.files.create(
+            file=("batch_input.jsonl", self._build_jsonl(requests).encode('utf-8')),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW
+        )
+        logger.info(f"已提交批处理任务 {batch.id}，共 {len(requests)} 个请求")
+
+        batch = self._wait_for_batch(batch.id)
+        if batch.status != "completed":
+            error_msg = f"批处理任务 {batch.id} 未完成，状态: {batch.status}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+        results = self._parse_output(batch.output_file_id) if batch.output_file_id else {}
+
+        missing = [custom_id for custom_id, _, _ in requests if custom_id not in results]
+        if missing:
+            error_msg = f"批处理任务 {batch.id} 有 {len(missing)} 个请求失败: {', '.join(missing[:10])}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+        logger.success(f"批处理任务 {batch.id} 完成，共 {len(results)} 个结果")
+        return results
+
+    def _build_jsonl(self, requests: List[Tuple[str, List[Dict], float]]) -> str:
+        """将请求列表序列化为批处理输入文件内容"""
+        lines = []
+        for custom_id, messages, temperature in requests:
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {"model": self.model, "messages": messages, "temperature": temperature}
+            }, ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def _wait_for_batch(self, batch_id: str):
+        """轮询直到批处理任务进入终止状态"""
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in _TERMINAL_STATUSES:
+                return batch
+
+            counts = batch.request_counts
+            if counts:
+                logger.info(f"批处理任务 {batch_id} 状态: {batch.status}，已完成 {counts.completed}/{counts.total}")
+            else:
+                logger.info(f"批处理任务 {batch_id} 状态: {batch.status}")
+            time.sleep(self.poll_interval)
+
+    def _parse_output(self, output_file_id: str) -> Dict[str, str]:
+        """下载输出文件，按 custom_id 取回成功请求的输出文本"""
+        results = {}
+        content = self.client.files.content(output_file_id).text
+
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            response = record.get("response") or {}
+
+            if record.get("error") or response.get("status_code") != 200:
+                logger.warning(f"批处理请求 {custom_id} 失败: {record.get('error') or response.get('body')}")
+                continue
+
+            results[custom_id] = response["body"]["choices"][0]["message"]["content"].strip()
+
+        return results
@@ -1,22 +1,121 @@
+import hashlib
 import re
-from typing import List, Dict, Tuple
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 from loguru import logger
+from text_processor import clean_whitespace
+
+try:
+    import tiktoken
+except ImportError:  # 未安装时按字符数计量
+    tiktoken = None
+
+# 以句末标点结尾的句子，或末尾不带标点的剩余文本
+_SENT_SPLIT_RE = re.compile(r'[^。！？.!?]*[。！？.!?]|[^。！？.!?]+\Z')
+# 句末标点集合，用于单字符判断
+_SENT_END = frozenset('。！？.!?')
+# 句末标点（连续的标点视为一个边界）
+_SENT_BOUNDARY_RE = re.compile(r'[。！？.!?]+')
+# 提取上下文摘要/预览时扫描的字符数，只需覆盖边界附近的两句话
+_CONTEXT_SCAN_CHARS = 600
+# 段落分隔（空行）
+_PARA_RE = re.compile(r'\n\s*\n')
+# 单块文本的上下文信息，只读，所有单块共用同一个对象
+SINGLE_CHUNK_CONTEXT = {'is_single': True}
+# 按文本内容缓存的分块结果和长度计数的条目数
+SPLIT_CACHE_ENTRIES = 8
+# 等待加载分词编码的最长秒数；本地没有缓存时 tiktoken 会不设超时地联网下载编码文件
+TOKENIZER_LOAD_TIMEOUT_SECONDS = 10
+
+# 以下长度上限按 TokenCounter 计量（加载到分词编码时为Token数，否则为字符数）的注明 TOKENS，
+# 始终按字符数计量的注明 CHARS
+# 编辑阶段每块的最大长度；编辑输出与输入等长，需低于常见模型单次4096个Token的输出上限
+EDIT_CHUNK_TOKENS = 2000
+# 全文超过该长度时才分块编辑
+CHUNKING_THRESHOLD_TOKENS = 3000
+# 相邻文本块之间的重叠字符数
+EDIT_OVERLAP_CHARS = 200
+# 拆分过长段落时，累计超过该字符数且恰在句末处切开
+_LONG_PARAGRAPH_SPLIT_CHARS = 100
+
+
+class TokenCounter:
+    """按模型的分词编码计算Token数；tiktoken不可用时按字符数计量"""
+
+    def __init__(self, model: Optional[str] = None):
+        """
+        初始化计数器
+
+        Args:
+            model: 模型名称，为None时按字符数计数；tiktoken不认识的模型使用 cl100k_base 编码
+        """
+        self.encoding = None
+        if model is not None and tiktoken is not None:
+            self.encoding = self._load_encoding(model)
+
+    @staticmethod
+    def _load_encoding(model: str):
+        """在后台线程中加载分词编码，超时或失败时返回None，退回按字符数计量"""
+        loaded = {}
+
+        def load():
+            try:
+                try:
+                    loaded['encoding'] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    loaded['encoding'] = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                loaded['error'] = e
+
+        # 下载卡住时不阻塞调用方；后台线程完成后 tiktoken 会缓存编码，之后新建的计数器可直接使用
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        thread.join(TOKENIZER_LOAD_TIMEOUT_SECONDS)
+        if 'encoding' in loaded:
+            return loaded['encoding']
+        if 'error' in loaded:
+            # 编码文件需联网下载，离线等情况下退回按字符数计量
+            logger.warning(f"加载分词编码失败，按字符数计量文本长度: {loaded['error']}")
+        else:
+            logger.warning(f"加载分词编码超过 {TOKENIZER_LOAD_TIMEOUT_SECONDS} 秒，按字符数计量文本长度")
+        return None
+
+    def __call__(self, text: str) -> int:
+        if self.encoding is None:
+            return len(text)
+        return len(self.encoding.encode_ordinary(text))
+
+
+def _text_digest(text: str) -> bytes:
+    """文本内容的摘要，作为分块和长度缓存的键"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
 
 
 class ChunkingProcessor:
     """编辑阶段的智能分块处理器"""
     
-    def __init__(self, chunk_size: int = 2000, overlap_size: int = 200):
+    def __init__(self, chunk_size: int = EDIT_CHUNK_TOKENS, overlap_size: int = EDIT_OVERLAP_CHARS,
+                 count_tokens: Optional[TokenCounter] = None):
         """
         初始化分块处理器
         
         Args:
-            chunk_size: 每个文本块的最大字符数（编辑阶段使用更大的块）
-            overlap_size: 文本块之间的重叠字符数（编辑阶段使用更大的重叠）
+            chunk_size: 每个文本块的最大长度（编辑阶段使用更大的块），按 count_tokens 计量
+            overlap_size: 文本块之间的重叠长度，始终按字符数计量（编辑阶段使用更大的重叠）
+            count_tokens: chunk_size 的计量方式，默认按字符数
         """
         self.chunk_size = chunk_size
         self.overlap_size = overlap_size
-        logger.info(f"初始化编辑分块处理器，分段大小: {chunk_size}, 重叠大小: {overlap_size}")
+        self.count_tokens = count_tokens or TokenCounter()
+        # 段落之间分隔符 "\n\n" 的长度
+        self._sep_len = self.count_tokens("\n\n")
+        # 按文本摘要缓存的分块结果和长度，同一文本在编辑和金句提取中只分块一次
+        self._split_cache = OrderedDict()
+        self._length_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        unit = "字符" if self.count_tokens.encoding is None else "Token"
+        logger.info(f"初始化编辑分块处理器，分段大小: {chunk_size} {unit}, 重叠大小: {overlap_size} 字符")
 
     def split_for_editing(self, text: str) -> List[Dict]:
         """
@@ -32,15 +131,62 @@ class ChunkingProcessor:
             - total: 总块数
             - context: 上下文信息
         """
-        if len(text) <= self.chunk_size:
-            logger.info(f"文本长度 {len(text)} 小于分段大小，无需分割")
-            return [{
-                'content': text,
-                'index': 1,
-                'total': 1,
-                'context': {'is_single': True}
-            }]
+        digest = _text_digest(text)
+        text_len = self._cached_length(digest, text)
+        if text_len <= self.chunk_size:
+            logger.info(f"文本长度 {text_len} 小于分段大小，无需分割")
+            return [self.single_chunk(text)]
+        
+        # 相同文本重复分块时直接复用结果，分块参数参与缓存键
+        key = (digest, self.chunk_size, self.overlap_size)
+        chunk_info_list = self._cache_get(self._split_cache, key)
+        if chunk_info_list is None:
+            chunk_info_list = self._split_for_editing_impl(text)
+            self._cache_set(self._split_cache, key, chunk_info_list)
+        else:
+            logger.info(f"复用已缓存的分块结果，共 {len(chunk_info_list)} 个块")
         
+        # 返回副本，调用方修改块信息或上下文都不影响缓存（上下文的值均为不可变对象）
+        return [
+            {**chunk_info, 'context': dict(chunk_info['context'])}
+            for chunk_info in chunk_info_list
+        ]
+
+    def _cached_length(self, digest: bytes, text: str) -> int:
+        """按文本摘要缓存长度计数，避免同一文本重复分词"""
+        text_len = self._cache_get(self._length_cache, digest)
+        if text_len is None:
+            text_len = self.count_tokens(text)
+            self._cache_set(self._length_cache, digest, text_len)
+        return text_len
+
+    def _cache_get(self, cache: OrderedDict, key):
+        """查询缓存并标记为最近使用，未命中时返回None"""
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _cache_set(self, cache: OrderedDict, key, value) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > SPLIT_CACHE_ENTRIES:
+                cache.popitem(last=False)
+
+    def single_chunk(self, text: str) -> Dict:
+        """将整段文本作为唯一的文本块"""
+        return {
+            'content': text,
+            'index': 1,
+            'total': 1,
+            'context': SINGLE_CHUNK_CONTEXT
+        }
+
+    def _split_for_editing_impl(self, text: str) -> List[Dict]:
+        """执行编辑分块：段落分割、组块并生成上下文信息"""
         # 首先按段落分割
         paragraphs = self._split_by_paragraphs(text)
         logger.info(f"文本包含 {len(paragraphs)} 个段落")
@@ -62,71 +208,92 @@ class ChunkingProcessor:
         logger.info(f"编辑分块完成，共 {len(chunks)} 个块")
         return chunk_info_list
 
-    def _split_by_paragraphs(self, text: str) -> List[str]:
-        """按段落分割文本"""
+    def _split_by_paragraphs(self, text: str) -> List[Tuple[str, int]]:
+        """按段落分割文本，返回 (段落, 长度) 列表，每段只计量一次"""
         # 清理文本
         text = self._clean_text(text)
         
         # 按双换行符分割段落
-        paragraphs = re.split(r'\n\s*\n', text)
-        paragraphs = [p.strip() for p in paragraphs if p.strip()]
+        paragraphs = [p for p in (p.strip() for p in _PARA_RE.split(text)) if p]
         
         # 如果段落过长，进一步分割
         final_paragraphs = []
         for para in paragraphs:
-            if len(para) <= self.chunk_size // 2:
-                final_paragraphs.append(para)
+            para_len = self.count_tokens(para)
+            if para_len <= self.chunk_size // 2:
+                final_paragraphs.append((para, para_len))
             else:
                 # 按句子分割长段落
                 sentences = self._split_long_paragraph(para)
-                final_paragraphs.extend(sentences)
+                final_paragraphs.extend((sentence, self.count_tokens(sentence)) for sentence in sentences)
         
         return final_paragraphs
 
     def _split_long_paragraph(self, paragraph: str) -> List[str]:
         """分割过长的段落"""
-        sentence_endings = ['。', '！', '？', '.', '!', '?']
         sentences = []
-        current = ""
+        pieces = []
+        current_len = 0
         
-        for char in paragraph:
-            current += char
-            if char in sentence_endings and len(current) > 100:
-                sentences.append(current.strip())
-                current = ""
+        # 逐句累积，累计字符数超过阈值且恰好在句末时切分
+        for sentence in _SENT_SPLIT_RE.findall(paragraph):
+            pieces.append(sentence)
+            current_len += len(sentence)
+            if current_len > _LONG_PARAGRAPH_SPLIT_CHARS and sentence[-1] in _SENT_END:
+                sentences.append(''.join(pieces).strip())
+                pieces = []
+                current_len = 0
         
-        if current.strip():
-            sentences.append(current.strip())
+        current = ''.join(pieces).strip()
+        if current:
+            sentences.append(current)
         
         return sentences
 
-    def _combine_paragraphs_to_chunks(self, paragraphs: List[str]) -> List[str]:
-        """将段落组合成合适大小的块"""
+    def _combine_paragraphs_to_chunks(self, paragraphs: List[Tuple[str, int]]) -> List[str]:
+        """将 (段落, 长度) 列表组合成合适大小的块"""
         chunks = []
-        current_chunk = ""
+        # 当前块以片段列表累积，只在块完成时拼接一次
+        current_pieces = []
+        current_len = 0
+        # 同步维护当前块末尾至多 2 倍重叠长度的文本，重叠只需在这段尾部中计算
+        tail_window = max(self.overlap_size, 0) * 2
+        tail = ""
         
-        for para in paragraphs:
+        sep_len = self._sep_len
+        
+        # 段落长度已在分割时计量，循环内只做加法
+        for para, para_len in paragraphs:
             # 检查添加当前段落是否会超出大小限制
-            if len(current_chunk) + len(para) + 2 <= self.chunk_size:
-                if current_chunk:
-                    current_chunk += "\n\n" + para
-                else:
-                    current_chunk = para
+            if current_len + para_len + sep_len <= self.chunk_size:
+                if current_pieces:
+                    current_len += sep_len
+                    if tail_window:
+                        tail = (tail + "\n\n" + para[-tail_window:])[-tail_window:]
+                elif tail_window:
+                    tail = para[-tail_window:]
+                current_pieces.append(para)
+                current_len += para_len
             else:
                 # 当前块已满，保存并开始新块
-                if current_chunk:
-                    chunks.append(current_chunk)
+                if current_pieces:
+                    chunks.append("\n\n".join(current_pieces))
                 
                 # 处理重叠
                 if chunks and self.overlap_size > 0:
-                    overlap_text = self._get_overlap_text(current_chunk, self.overlap_size)
-                    current_chunk = overlap_text + "\n\n" + para
+                    overlap_text = self._get_overlap_text(tail, self.overlap_size)
+                    current_pieces = [overlap_text, para]
+                    current_len = self.count_tokens(overlap_text) + sep_len + para_len
+                    tail = (overlap_text + "\n\n" + para[-tail_window:])[-tail_window:]
                 else:
-                    current_chunk = para
+                    current_pieces = [para]
+                    current_len = para_len
+                    if tail_window:
+                        tail = para[-tail_window:]
         
         # 添加最后一个块
-        if current_chunk:
-            chunks.append(current_chunk)
+        if current_pieces:
+            chunks.append("\n\n".join(current_pieces))
         
         return chunks
 
@@ -137,12 +304,11 @@ class ChunkingProcessor:
         
         # 尝试在句子边界获取重叠
         overlap_text = text[-overlap_size:]
-        sentence_endings = ['。', '！', '？', '.', '!', '?']
         
         # 寻找最近的句子结束点
-        for i, char in enumerate(overlap_text):
-            if char in sentence_endings:
-                return overlap_text[i+1:].strip()
+        match = _SENT_BOUNDARY_RE.search(overlap_text)
+        if match:
+            return overlap_text[match.start()+1:].strip()
         
         return overlap_text
 
@@ -167,10 +333,16 @@ class ChunkingProcessor:
         
         return context
 
+    def _split_sentences(self, text: str) -> List[str]:
+        """按句末标点拆分句子，去除空白句"""
+        return [s for s in (s.strip() for s in _SENT_BOUNDARY_RE.split(text)) if s]
+
     def _extract_summary(self, text: str) -> str:
         """提取文本的简要摘要（最后几句话）"""
-        sentences = re.split(r'[。！？.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+        # 先只扫描末尾部分；窗口内至少有三句时，最后两句必然完整
+        sentences = self._split_sentences(text[-_CONTEXT_SCAN_CHARS:])
+        if len(sentences) < 3 and len(text) > _CONTEXT_SCAN_CHARS:
+            sentences = self._split_sentences(text)
         
         if len(sentences) <= 2:
             return text[:100] + "..." if len(text) > 100 else text
@@ -180,8 +352,10 @@ class ChunkingProcessor:
 
     def _extract_preview(self, text: str) -> str:
         """提取文本的预览（前几句话）"""
-        sentences = re.split(r'[。！？.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+        # 先只扫描开头部分；窗口内至少有三句时，前两句必然完整
+        sentences = self._split_sentences(text[:_CONTEXT_SCAN_CHARS])
+        if len(sentences) < 3 and len(text) > _CONTEXT_SCAN_CHARS:
+            sentences = self._split_sentences(text)
         
         if len(sentences) <= 2:
             return text[:100] + "..." if len(text) > 100 else text
@@ -191,27 +365,17 @@ class ChunkingProcessor:
 
     def _clean_text(self, text: str) -> str:
         """清理文本，标准化空白字符"""
-        # 标准化换行符
-        text = re.sub(r'\r\n', '\n', text)
-        text = re.sub(r'\r', '\n', text)
-        
-        # 清理多余的空白，但保留段落分隔
-        text = re.sub(r'[ \t]+', ' ', text)  # 多个空格/制表符 -> 单个空格
-        text = re.sub(r'\n[ \t]+', '\n', text)  # 行首空白
-        text = re.sub(r'[ \t]+\n', '\n', text)  # 行尾空白
-        text = re.sub(r'\n{3,}', '\n\n', text)  # 多个换行 -> 双换行
-        
-        return text.strip()
+        return clean_whitespace(text)
 
-    def should_use_chunking(self, text: str, threshold: int = 3000) -> bool:
+    def should_use_chunking(self, text: str, threshold: int = CHUNKING_THRESHOLD_TOKENS) -> bool:
         """
         判断是否需要使用分块处理
         
         Args:
             text: 输入文本
-            threshold: 长度阈值
+            threshold: 长度阈值，与 chunk_size 一样按 count_tokens 计量
             
         Returns:
             是否需要分块处理
         """
-        return len(text) > threshold
\ No newline at end of file
+        return self._cached_length(_text_digest(text), text) > threshold
\ No newline at end of file
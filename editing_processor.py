@@ -1,12 +1,151 @@
+import re
+import asyncio
+from functools import partial
+import httpx
 import openai
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Callable, Optional
 from loguru import logger
+from async_scheduler import RateLimiter, RequestScheduler, call_with_retry, estimate_messages_tokens
+
+# 同时进行中的LLM请求数上限
+MAX_CONCURRENT_REQUESTS = 8
+
+# HTTP连接池上限，保持与LLM服务的长连接复用
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+
+# 流式输出时每收到多少个增量片段回调一次进度
+STREAM_PROGRESS_INTERVAL = 20
+
+# 编辑整理的固定指令，作为系统消息放在最前，使所有文本块共享相同的提示词前缀以命中服务端缓存
+EDIT_CHUNK_SYSTEM = """请对用户提供的已校对文字进行编辑整理。
+
+编辑要求：
+1. 合理分段，每段内容相对独立
+2. 为每个段落添加合适的小标题（使用 ## 格式）
+3. 优化文字结构和逻辑顺序
+4. 使用Markdown格式输出
+5. 保持内容的完整性和准确性
+
+输出格式要求：
+- 使用 ## 作为主要段落标题
+- 使用 ### 作为子段落标题（如需要）
+- 保持Markdown格式的规范性
+
+请直接输出整理后的Markdown格式文字，不要添加任何说明。"""
+
+# 金句提取的固定指令
+QUOTE_EXTRACT_SYSTEM = """请从用户提供的文字中提取有深度、有启发性、有哲理或特别有意义的句子作为精彩金句。
+
+要求：
+1. 选择最有价值和启发性的句子
+2. 每个金句应该相对独立，有完整的意思
+3. 优先选择有哲理性、指导性或深刻见解的内容
+4. 数量控制在3-8句之间
+5. 按重要性排序
+
+请直接输出金句列表，每行一个，使用 "- " 开头。"""
+
+# 合并为一次请求的文本块数上限；编辑默认逐块并发请求，只在请求数配额紧张时按需合并
+BATCH_GROUP_SIZE = 4
+# 合并编辑时各块正文的总字符数上限；编辑输出与输入等长，需低于常见模型单次4096个Token的
+# 输出上限（中文一字约一至两个Token），否则输出被截断，未闭合的块都要重新请求
+EDIT_BATCH_MAX_CHARS = 2000
+# 合并提取金句时各段文字的总字符数上限；输出很短，只需放得进上下文
+QUOTE_BATCH_MAX_CHARS = 12000
+
+# 一至三级Markdown标题（允许行首空白）
+_TITLE_RE = re.compile(r'^[^\S\n]*(#{1,3})[^\S\n]+(\S.*)$', re.M)
+# 精彩金句部分，截止到下一个二级标题或文末
+_GOLDEN_RE = re.compile(r'##\s*💎\s*精彩金句\s*\n(.*?)(?=\n##|\Z)', re.DOTALL)
+# 列表项形式的金句
+_QUOTE_RE = re.compile(r'^[^\S\n]*[-*][^\S\n]+(\S.*)$', re.M)
+# 合并请求输出中按段号包裹的各段结果
+_BLOCK_RE = re.compile(r'<<<BLOCK\s+(\d+)>>>(.*?)<<</BLOCK\s+\1>>>', re.DOTALL)
+
+
+def build_messages(system_prompt: str, *sections: str) -> List[Dict]:
+    """
+    组装对话消息：固定的系统指令在前，动态内容按顺序放在用户消息中
+    
+    Args:
+        system_prompt: 固定不变的系统指令
+        sections: 用户消息的各个部分，空字符串会被忽略
+        
+    Returns:
+        chat.completions 所需的消息列表
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "\n\n".join(section for section in sections if section)}
+    ]
+
+
+def format_messages(messages: List[Dict]) -> str:
+    """将消息列表拼接为便于日志查看的文本"""
+    return "\n\n".join(message["content"] for message in messages)
+
+
+def group_by_size(sizes: List[int], max_items: int, max_chars: int) -> List[List[int]]:
+    """
+    将连续的条目按数量和总字符数上限分组
+    
+    Args:
+        sizes: 各条目的字符数
+        max_items: 每组最多条目数
+        max_chars: 每组总字符数上限，单个超限的条目独占一组
+        
+    Returns:
+        各组条目下标的列表，保持原顺序
+    """
+    groups = []
+    current = []
+    current_chars = 0
+    for i, size in enumerate(sizes):
+        if current and (len(current) >= max_items or current_chars + size > max_chars):
+            groups.append(current)
+            current = []
+            current_chars = 0
+        current.append(i)
+        current_chars += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def wrap_blocks(blocks: List[str]) -> str:
+    """用从1开始编号的 <<<BLOCK i>>> 分隔符包裹各段内容"""
+    return "\n\n".join(
+        f"<<<BLOCK {i}>>>\n{block}\n<<</BLOCK {i}>>>" for i, block in enumerate(blocks, 1)
+    )
+
+
+def parse_blocks(result: str) -> Dict[int, str]:
+    """从合并请求的输出中按段号取回各段结果，缺失或未闭合的段不会出现在结果中"""
+    return {int(match.group(1)): match.group(2).strip() for match in _BLOCK_RE.finditer(result)}
+
+
+def create_http_client() -> httpx.Client:
+    """创建同步HTTP连接池；超时沿用openai客户端默认值，避免长文本生成被提前中断"""
+    return httpx.Client(limits=HTTP_POOL_LIMITS, timeout=openai.DEFAULT_TIMEOUT, follow_redirects=True)
+
+
+def create_async_client(api_key: str, base_url) -> openai.AsyncOpenAI:
+    """
+    创建使用连接池的异步客户端
+
+    异步连接绑定在创建它的事件循环上，而每个批次都通过 asyncio.run 使用新的事件循环，
+    因此每批创建一个异步客户端，在批内复用连接；退出 async with 时连接池随之关闭。
+    """
+    http_client = httpx.AsyncClient(limits=HTTP_POOL_LIMITS, timeout=openai.DEFAULT_TIMEOUT, follow_redirects=True)
+    # 重试统一由调度器在共享限流器下进行，关闭SDK自带的重试
+    return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
 
 
 class EditingProcessor:
     """编辑整理处理器，负责分块编辑逻辑"""
     
-    def __init__(self, api_key: str, base_url: str, model: str):
+    def __init__(self, api_key: str, base_url: str, model: str, http_client: Optional[httpx.Client] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         """
         初始化编辑处理器
         
@@ -14,12 +153,59 @@ class EditingProcessor:
             api_key: OpenAI API密钥
             base_url: API基础URL
             model: 使用的模型名称
+            http_client: 复用的HTTP连接池，未提供时自行创建
+            rate_limiter: 与其他请求共用的限流器，未提供时自行创建
         """
-        self.client = openai.OpenAI(api_key=api_key, base_url=base_url)
+        # 重试统一由 call_with_retry 在共享限流器下进行，关闭SDK自带的重试
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url,
+                                    http_client=http_client or create_http_client(), max_retries=0)
         self.model = model
+        self.rate_limiter = rate_limiter or RateLimiter()
         logger.info(f"初始化编辑处理器，使用模型: {model}")
 
-    def edit_chunk(self, chunk_info: Dict, domain_knowledge: str = "", keywords: str = "") -> Dict:
+    def _stream_completion(self, messages: List[Dict], temperature: float,
+                           on_progress: Optional[Callable[[str], None]] = None) -> str:
+        """
+        以流式方式请求LLM并累积输出，限流或连接错误时退避重试
+        
+        Args:
+            messages: 对话消息列表
+            temperature: 采样温度
+            on_progress: 可选回调，定期传入当前已生成的文本
+            
+        Returns:
+            完整的输出文本
+        """
+        return call_with_retry(
+            partial(self._stream_completion_once, messages, temperature, on_progress),
+            limiter=self.rate_limiter, token_cost=estimate_messages_tokens(messages)
+        )
+
+    def _stream_completion_once(self, messages: List[Dict], temperature: float,
+                                on_progress: Optional[Callable[[str], None]]) -> str:
+        """发送一次流式请求并累积输出"""
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            stream=True
+        )
+        
+        parts = []
+        for chunk in stream:
+            # 部分兼容服务会发送不含choices的统计数据包
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                if on_progress and len(parts) % STREAM_PROGRESS_INTERVAL == 0:
+                    on_progress(''.join(parts))
+        
+        return ''.join(parts).strip()
+
+    def edit_chunk(self, chunk_info: Dict, domain_knowledge: str = "", keywords: str = "",
+                   on_progress: Optional[Callable[[str], None]] = None) -> Dict:
         """
         编辑单个文本块
         
@@ -27,144 +213,171 @@ class EditingProcessor:
             chunk_info: 包含文本块信息的字典
             domain_knowledge: 领域知识
             keywords: 关键字
+            on_progress: 可选回调，流式输出过程中传入当前已生成的文本
             
         Returns:
             编辑结果字典，包含编辑后的内容和元数据
         """
-        content = chunk_info['content']
-        index = chunk_info['index']
-        total = chunk_info['total']
-        context = chunk_info['context']
+        messages, index, total = self._prepare_edit(chunk_info, domain_knowledge, keywords)
         
-        logger.info(f"开始编辑第 {index}/{total} 个文本块")
+        try:
+            result = self._stream_completion(messages, 0.3, on_progress)
+            return self._build_edit_result(result, index, total)
+            
+        except Exception as e:
+            error_msg = f"第 {index}/{total} 块编辑失败: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    def _create_async_client(self) -> openai.AsyncOpenAI:
+        """创建与同步客户端配置相同的异步客户端，每个批次使用一个"""
+        return create_async_client(self.client.api_key, self.client.base_url)
+
+    async def _astream_completion(self, aclient: openai.AsyncOpenAI, messages: List[Dict],
+                                  temperature: float) -> str:
+        """以流式方式异步请求LLM并累积输出"""
+        stream = await aclient.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            stream=True
+        )
         
-        # 构建提示词
-        prompt = self._build_editing_prompt(content, index, total, context, domain_knowledge, keywords)
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
         
-        logger.info(f"编辑提示词:\n{'-'*50}\n{prompt}\n{'-'*50}")
+        return ''.join(parts).strip()
+
+    async def _edit_chunk_async(self, aclient: openai.AsyncOpenAI, scheduler: RequestScheduler,
+                                chunk_info: Dict, domain_knowledge: str, keywords: str) -> Dict:
+        """异步编辑单个文本块，请求经调度器限流和重试"""
+        messages, index, total = self._prepare_edit(chunk_info, domain_knowledge, keywords)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
+            result = await scheduler.submit(
+                lambda: self._astream_completion(aclient, messages, 0.3), estimate_messages_tokens(messages)
             )
-            
-            result = response.choices[0].message.content.strip()
-            
-            # 解析编辑结果
-            parsed_result = self._parse_editing_result(result, index, total)
-            
-            logger.success(f"第 {index}/{total} 块编辑完成，输出长度: {len(result)} 字符")
-            
-            return {
-                'content': parsed_result['content'],
-                'titles': parsed_result['titles'],
-                'golden_quotes': parsed_result['golden_quotes'],
-                'index': index,
-                'total': total,
-                'raw_result': result
-            }
+            return self._build_edit_result(result, index, total)
             
         except Exception as e:
             error_msg = f"第 {index}/{total} 块编辑失败: {str(e)}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
-    def _build_editing_prompt(self, content: str, index: int, total: int, context: Dict, 
-                            domain_knowledge: str, keywords: str) -> str:
-        """构建编辑提示词"""
+    def _prepare_edit(self, chunk_info: Dict, domain_knowledge: str, keywords: str) -> Tuple[List[Dict], int, int]:
+        """读取文本块信息并构建编辑消息，返回 (消息列表, 块索引, 总块数)"""
+        content = chunk_info['content']
+        index = chunk_info['index']
+        total = chunk_info['total']
+        context = chunk_info['context']
+        
+        logger.info(f"开始编辑第 {index}/{total} 个文本块")
+        
+        # 构建提示词
+        messages = self._build_editing_messages(content, index, total, context, domain_knowledge, keywords)
+        
+        # 完整提示词仅在DEBUG级别输出，且只有该级别启用时才会格式化
+        logger.opt(lazy=True).debug("编辑提示词:\n{}", lambda: f"{'-'*50}\n{format_messages(messages)}\n{'-'*50}")
         
-        # 基础提示
-        base_prompt = f"""请对以下已校对的文字进行编辑整理，这是第 {index}/{total} 个文本块。
+        return messages, index, total
 
-编辑要求：
-1. 合理分段，每段内容相对独立
-2. 为每个段落添加合适的小标题（使用 ## 格式）
-3. 优化文字结构和逻辑顺序
-4. 使用Markdown格式输出
-5. 保持内容的完整性和准确性"""
+    def _build_edit_result(self, result: str, index: int, total: int) -> Dict:
+        """解析LLM输出并组装编辑结果字典"""
+        parsed_result = self._parse_editing_result(result, index, total)
+        
+        logger.success(f"第 {index}/{total} 块编辑完成，输出长度: {len(result)} 字符")
+        
+        return {
+            'content': parsed_result['content'],
+            'titles': parsed_result['titles'],
+            'golden_quotes': parsed_result['golden_quotes'],
+            'index': index,
+            'total': total,
+            'raw_result': result
+        }
 
-        # 添加上下文信息
-        context_info = ""
+    def _build_editing_messages(self, content: str, index: int, total: int, context: Dict, 
+                                domain_knowledge: str, keywords: str) -> List[Dict]:
+        """构建编辑消息：固定指令在前，领域知识、关键字、文本块信息和待编辑文字依次在后"""
+        return build_messages(
+            EDIT_CHUNK_SYSTEM,
+            f"领域知识：{domain_knowledge}" if domain_knowledge else "",
+            f"关键字：{keywords}" if keywords else "",
+            self._build_chunk_notes(index, total, context),
+            f"待编辑文字：\n{content}"
+        )
+
+    def _build_batched_editing_messages(self, chunk_info_list: List[Dict], domain_knowledge: str,
+                                        keywords: str) -> List[Dict]:
+        """构建合并编辑消息：多个文本块各自带上位置信息，按段号包裹后放在同一条用户消息中"""
+        blocks = [
+            f"{self._build_chunk_notes(chunk['index'], chunk['total'], chunk['context'])}\n\n"
+            f"待编辑文字：\n{chunk['content']}"
+            for chunk in chunk_info_list
+        ]
+        return build_messages(
+            EDIT_CHUNK_SYSTEM,
+            f"领域知识：{domain_knowledge}" if domain_knowledge else "",
+            f"关键字：{keywords}" if keywords else "",
+            f"以下 {len(blocks)} 段文字请分别编辑整理，不要合并或遗漏，"
+            f"每段的输出用 <<<BLOCK i>>> 和 <<</BLOCK i>>> 包裹（i 为段号）：",
+            wrap_blocks(blocks)
+        )
+
+    def _build_chunk_notes(self, index: int, total: int, context: Dict) -> str:
+        """生成文本块的位置及上下文说明"""
+        # 文本块位置及上下文信息
+        chunk_info = f"这是第 {index}/{total} 个文本块。"
         if not context.get('is_single', False):
             if context.get('is_first'):
-                context_info += "\n\n**注意：这是第一个文本块，请设置合适的开头结构。**"
+                chunk_info += "\n**注意：这是第一个文本块，请设置合适的开头结构。**"
             elif context.get('is_last'):
-                context_info += "\n\n**注意：这是最后一个文本块，请在文档最后添加\"💎 精彩金句\"部分。**"
+                chunk_info += "\n**注意：这是最后一个文本块，请在文档最后添加\"💎 精彩金句\"部分。**"
             else:
-                context_info += f"\n\n**注意：这是中间文本块（第{index}/{total}块），请保持与前后内容的连贯性。**"
+                chunk_info += f"\n**注意：这是中间文本块（第{index}/{total}块），请保持与前后内容的连贯性。**"
             
             if context.get('previous_summary'):
-                context_info += f"\n前一块内容摘要：{context['previous_summary']}"
+                chunk_info += f"\n前一块内容摘要：{context['previous_summary']}"
             
             if context.get('next_preview'):
-                context_info += f"\n下一块内容预览：{context['next_preview']}"
-
-        # 添加领域知识和关键字
-        domain_info = ""
-        if domain_knowledge:
-            domain_info += f"\n\n领域知识：{domain_knowledge}"
-        if keywords:
-            domain_info += f"\n关键字：{keywords}"
-
-        # 输出格式要求
-        format_requirements = """
-
-输出格式要求：
-- 使用 ## 作为主要段落标题
-- 使用 ### 作为子段落标题（如需要）
-- 保持Markdown格式的规范性"""
+                chunk_info += f"\n下一块内容预览：{context['next_preview']}"
 
         # 特殊处理最后一块
         if context.get('is_last') or context.get('is_single', False):
-            format_requirements += """
+            chunk_info += """
+
+额外要求：
 - 在文档最后添加：
   ## 💎 精彩金句
   - 金句1
   - 金句2
   - ..."""
 
-        # 组合完整提示词
-        full_prompt = base_prompt + context_info + domain_info + format_requirements + f"""
-
-待编辑文字：
-{content}
-
-请直接输出整理后的Markdown格式文字，不要添加任何说明："""
-
-        return full_prompt
+        return chunk_info
 
     def _parse_editing_result(self, result: str, index: int, total: int) -> Dict:
         """解析编辑结果，提取标题和金句"""
-        import re
-        
         # 提取标题
-        titles = []
-        title_pattern = r'^(#{1,3})\s+(.+)$'
-        for line in result.split('\n'):
-            match = re.match(title_pattern, line.strip())
-            if match:
-                level = len(match.group(1))
-                title = match.group(2).strip()
-                titles.append({'level': level, 'title': title})
+        titles = [
+            {'level': len(match.group(1)), 'title': match.group(2).strip()}
+            for match in _TITLE_RE.finditer(result)
+        ]
         
         # 提取金句（如果是最后一块或单独一块）
         golden_quotes = []
         if index == total or total == 1:
             # 查找金句部分
-            golden_section_pattern = r'##\s*💎\s*精彩金句\s*\n(.*?)(?=\n##|\Z)'
-            match = re.search(golden_section_pattern, result, re.DOTALL)
+            match = _GOLDEN_RE.search(result)
             if match:
-                quotes_text = match.group(1)
-                # 提取列表项
-                quote_pattern = r'^\s*[-*]\s+(.+)$'
-                for line in quotes_text.split('\n'):
-                    quote_match = re.match(quote_pattern, line.strip())
-                    if quote_match:
-                        golden_quotes.append(quote_match.group(1).strip())
+                golden_quotes = [
+                    quote_match.group(1).strip()
+                    for quote_match in _QUOTE_RE.finditer(match.group(1))
+                ]
         
         return {
             'content': result,
@@ -173,7 +386,8 @@ class EditingProcessor:
         }
 
     def edit_chunks_batch(self, chunk_info_list: List[Dict], domain_knowledge: str = "", 
-                         keywords: str = "") -> List[Dict]:
+                         keywords: str = "", group_size: int = 1,
+                         on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
         """
         批量编辑文本块
         
@@ -181,23 +395,91 @@ class EditingProcessor:
             chunk_info_list: 文本块信息列表
             domain_knowledge: 领域知识
             keywords: 关键字
+            group_size: 合并为一次请求的最多块数；默认为1，各块并发请求以缩短总耗时，
+                请求数配额紧张时可传入 BATCH_GROUP_SIZE 合并较短的相邻块
+            on_result: 可选回调，每块编辑完成时立即传入其结果（按完成顺序），用于边编辑边合并
             
         Returns:
             编辑结果列表
         """
-        results = []
-        
-        for chunk_info in chunk_info_list:
-            try:
-                result = self.edit_chunk(chunk_info, domain_knowledge, keywords)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"批量编辑中断，已完成 {len(results)} 个块")
-                raise e
+        # 各组（默认每块一组）在事件循环中并发编辑，结果按原顺序返回
+        results = asyncio.run(
+            self._edit_chunks_async(chunk_info_list, domain_knowledge, keywords, group_size, on_result)
+        )
         
         logger.success(f"批量编辑完成，共处理 {len(results)} 个文本块")
         return results
 
+    async def _edit_chunks_async(self, chunk_info_list: List[Dict], domain_knowledge: str,
+                                 keywords: str, group_size: int,
+                                 on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """并发编辑所有文本块分组，任一组失败时取消其余请求"""
+        scheduler = RequestScheduler(self.rate_limiter, max_concurrency=MAX_CONCURRENT_REQUESTS)
+        groups = [
+            [chunk_info_list[i] for i in group]
+            for group in group_by_size(
+                [len(chunk['content']) for chunk in chunk_info_list], group_size, EDIT_BATCH_MAX_CHARS
+            )
+        ]
+        logger.info(f"{len(chunk_info_list)} 个文本块合并为 {len(groups)} 次请求")
+        
+        async with self._create_async_client() as aclient:
+            async def edit_group(group: List[Dict]) -> List[Dict]:
+                results = await self._edit_group_async(aclient, scheduler, group, domain_knowledge, keywords)
+                # 已完成的组立即交给回调处理，与其余组的生成重叠进行
+                if on_result:
+                    for result in results:
+                        on_result(result)
+                return results
+            
+            tasks = [asyncio.create_task(edit_group(group)) for group in groups]
+            try:
+                results_per_group = await asyncio.gather(*tasks)
+                return [result for results in results_per_group for result in results]
+            except Exception:
+                completed = sum(
+                    len(task.result()) for task in tasks
+                    if task.done() and not task.cancelled() and task.exception() is None
+                )
+                for task in tasks:
+                    task.cancel()
+                logger.error(f"批量编辑中断，已完成 {completed} 个块")
+                raise
+            finally:
+                logger.info(f"编辑请求调度统计：{scheduler.status.summary()}")
+
+    async def _edit_group_async(self, aclient: openai.AsyncOpenAI, scheduler: RequestScheduler,
+                                group: List[Dict], domain_knowledge: str, keywords: str) -> List[Dict]:
+        """用一次请求编辑一组文本块，输出中缺失的块单独重新编辑"""
+        if len(group) == 1:
+            return [await self._edit_chunk_async(aclient, scheduler, group[0], domain_knowledge, keywords)]
+        
+        first, last, total = group[0]['index'], group[-1]['index'], group[0]['total']
+        logger.info(f"开始合并编辑第 {first}-{last}/{total} 个文本块")
+        
+        messages = self._build_batched_editing_messages(group, domain_knowledge, keywords)
+        logger.opt(lazy=True).debug("合并编辑提示词:\n{}", lambda: f"{'-'*50}\n{format_messages(messages)}\n{'-'*50}")
+        
+        try:
+            result = await scheduler.submit(
+                lambda: self._astream_completion(aclient, messages, 0.3), estimate_messages_tokens(messages)
+            )
+        except Exception as e:
+            error_msg = f"第 {first}-{last}/{total} 块编辑失败: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        
+        blocks = parse_blocks(result)
+        
+        async def collect(position: int, chunk_info: Dict) -> Dict:
+            block = blocks.get(position)
+            if block:
+                return self._build_edit_result(block, chunk_info['index'], chunk_info['total'])
+            logger.warning(f"合并编辑输出缺少第 {chunk_info['index']}/{total} 块，单独重新编辑")
+            return await self._edit_chunk_async(aclient, scheduler, chunk_info, domain_knowledge, keywords)
+        
+        return await asyncio.gather(*(collect(position, chunk_info) for position, chunk_info in enumerate(group, 1)))
+
     def extract_golden_quotes_from_text(self, text: str, domain_knowledge: str = "", 
                                       keywords: str = "") -> List[str]:
         """
@@ -211,50 +493,129 @@ class EditingProcessor:
         Returns:
             金句列表
         """
-        prompt = f"""请从以下文字中提取有深度、有启发性、有哲理或特别有意义的句子作为精彩金句。
-
-要求：
-1. 选择最有价值和启发性的句子
-2. 每个金句应该相对独立，有完整的意思
-3. 优先选择有哲理性、指导性或深刻见解的内容
-4. 数量控制在3-8句之间
-5. 按重要性排序
+        messages = self._build_golden_quotes_messages(text, domain_knowledge, keywords)
+        
+        try:
+            result = self._stream_completion(messages, 0.4)
+            return self._parse_golden_quotes(result)
+            
+        except Exception as e:
+            error_msg = f"金句提取失败: {str(e)}"
+            logger.error(error_msg)
+            return []
 
-{f"领域知识：{domain_knowledge}" if domain_knowledge else ""}
-{f"关键字：{keywords}" if keywords else ""}
+    def extract_golden_quotes_batch(self, texts: List[str], domain_knowledge: str = "",
+                                    keywords: str = "", group_size: int = BATCH_GROUP_SIZE) -> List[List[str]]:
+        """
+        并发从多段文本中提取金句
+        
+        Args:
+            texts: 文本列表
+            domain_knowledge: 领域知识
+            keywords: 关键字
+            group_size: 合并为一次请求的最多段数，为1时逐段请求
+            
+        Returns:
+            与输入顺序一致的金句列表，提取失败的文本对应空列表
+        """
+        return asyncio.run(self._extract_golden_quotes_batch_async(texts, domain_knowledge, keywords, group_size))
 
-文字内容：
-{text}
+    async def _extract_golden_quotes_batch_async(self, texts: List[str], domain_knowledge: str,
+                                                 keywords: str, group_size: int) -> List[List[str]]:
+        """在同一事件循环中并发提取各组文本的金句"""
+        scheduler = RequestScheduler(self.rate_limiter, max_concurrency=MAX_CONCURRENT_REQUESTS)
+        groups = [
+            [texts[i] for i in group]
+            for group in group_by_size([len(text) for text in texts], group_size, QUOTE_BATCH_MAX_CHARS)
+        ]
+        
+        async with self._create_async_client() as aclient:
+            quotes_per_group = await asyncio.gather(*(
+                self._extract_golden_quotes_group_async(aclient, scheduler, group, domain_knowledge, keywords)
+                for group in groups
+            ))
+        
+        logger.info(f"金句请求调度统计：{scheduler.status.summary()}")
+        return [quotes for group_quotes in quotes_per_group for quotes in group_quotes]
 
-请直接输出金句列表，每行一个，使用 "- " 开头："""
+    async def _extract_golden_quotes_group_async(self, aclient: openai.AsyncOpenAI, scheduler: RequestScheduler,
+                                                 texts: List[str], domain_knowledge: str,
+                                                 keywords: str) -> List[List[str]]:
+        """用一次请求提取一组文本的金句，输出中缺失的段单独重新提取"""
+        if len(texts) == 1:
+            return [await self._extract_golden_quotes_async(aclient, scheduler, texts[0], domain_knowledge, keywords)]
+        
+        messages = build_messages(
+            QUOTE_EXTRACT_SYSTEM,
+            f"领域知识：{domain_knowledge}" if domain_knowledge else "",
+            f"关键字：{keywords}" if keywords else "",
+            f"以下 {len(texts)} 段文字请分别提取金句，"
+            f"每段的金句列表用 <<<BLOCK i>>> 和 <<</BLOCK i>>> 包裹（i 为段号）：",
+            wrap_blocks(texts)
+        )
+        
+        logger.info(f"开始合并提取 {len(texts)} 段文字的精彩金句")
+        logger.opt(lazy=True).debug("合并金句提取提示词:\n{}", lambda: f"{'-'*50}\n{format_messages(messages)}\n{'-'*50}")
+        
+        try:
+            result = await scheduler.submit(
+                lambda: self._astream_completion(aclient, messages, 0.4), estimate_messages_tokens(messages)
+            )
+        except Exception as e:
+            error_msg = f"金句提取失败: {str(e)}"
+            logger.error(error_msg)
+            return [[] for _ in texts]
+        
+        blocks = parse_blocks(result)
+        
+        async def collect(position: int, text: str) -> List[str]:
+            if position in blocks:
+                return self._parse_golden_quotes(blocks[position])
+            logger.warning(f"合并金句提取输出缺少第 {position} 段，单独重新提取")
+            return await self._extract_golden_quotes_async(aclient, scheduler, text, domain_knowledge, keywords)
+        
+        return await asyncio.gather(*(collect(position, text) for position, text in enumerate(texts, 1)))
 
-        logger.info("开始提取精彩金句")
-        logger.info(f"金句提取提示词:\n{'-'*50}\n{prompt}\n{'-'*50}")
+    async def _extract_golden_quotes_async(self, aclient: openai.AsyncOpenAI, scheduler: RequestScheduler,
+                                           text: str, domain_knowledge: str, keywords: str) -> List[str]:
+        """异步提取单段文本的金句，失败时返回空列表"""
+        messages = self._build_golden_quotes_messages(text, domain_knowledge, keywords)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4
+            result = await scheduler.submit(
+                lambda: self._astream_completion(aclient, messages, 0.4), estimate_messages_tokens(messages)
             )
-            
-            result = response.choices[0].message.content.strip()
-            
-            # 解析金句
-            quotes = []
-            for line in result.split('\n'):
-                line = line.strip()
-                if line.startswith('- '):
-                    quote = line[2:].strip()
-                    if quote:
-                        quotes.append(quote)
-            
-            logger.success(f"金句提取完成，共提取 {len(quotes)} 个金句")
-            return quotes
+            return self._parse_golden_quotes(result)
             
         except Exception as e:
             error_msg = f"金句提取失败: {str(e)}"
             logger.error(error_msg)
-            return []
\ No newline at end of file
+            return []
+
+    def _build_golden_quotes_messages(self, text: str, domain_knowledge: str, keywords: str) -> List[Dict]:
+        """构建金句提取消息"""
+        messages = build_messages(
+            QUOTE_EXTRACT_SYSTEM,
+            f"领域知识：{domain_knowledge}" if domain_knowledge else "",
+            f"关键字：{keywords}" if keywords else "",
+            f"文字内容：\n{text}"
+        )
+
+        logger.info("开始提取精彩金句")
+        # 完整提示词仅在DEBUG级别输出，且只有该级别启用时才会格式化
+        logger.opt(lazy=True).debug("金句提取提示词:\n{}", lambda: f"{'-'*50}\n{format_messages(messages)}\n{'-'*50}")
+        
+        return messages
+
+    def _parse_golden_quotes(self, result: str) -> List[str]:
+        """解析金句列表输出"""
+        quotes = []
+        for line in result.split('\n'):
+            line = line.strip()
+            if line.startswith('- '):
+                quote = line[2:].strip()
+                if quote:
+                    quotes.append(quote)
+        
+        logger.success(f"金句提取完成，共提取 {len(quotes)} 个金句")
+        return quotes
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional, Protocol, Tuple
+from loguru import logger
+
+# 默认缓存容量与过期时间
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 3600
+
+# 语义匹配的余弦相似度阈值，以及参与比较的最近条目数
+SEMANTIC_SIMILARITY_THRESHOLD = 0.92
+SEMANTIC_RECENT_ENTRIES = 64
+
+
+def make_cache_key(model: str, messages: List[Dict], temperature: float) -> str:
+    """根据模型、消息和温度生成缓存键"""
+    payload = {"model": model, "messages": messages, "temperature": temperature}
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+
+def _cosine_similarity(a: List[float], b: List[float]) -> float:
+    """计算两个向量的余弦相似度"""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class CacheBackend(Protocol):
+    """缓存后端接口"""
+
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        ...
+
+
+class MemoryLRUBackend:
+    """线程安全的内存LRU缓存"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class FileBackend:
+    """基于本地文件的持久化缓存，每个条目保存为一个JSON文件"""
+
+    def __init__(self, directory: str = "cache/llm"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) < time.time():
+            return None
+        return entry.get("value")
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        try:
+            with open(self._path(key), 'w', encoding='utf-8') as f:
+                json.dump({"expires_at": time.time() + ttl, "value": value}, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"写入LLM缓存失败: {e}")
+
+
+class LLMCache:
+    """LLM响应缓存：先按请求内容精确匹配，可选再按提示词语义相似度匹配"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = DEFAULT_TTL_SECONDS,
+                 cache_sampled: bool = False,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 similarity_threshold: float = SEMANTIC_SIMILARITY_THRESHOLD):
+        """
+        初始化缓存
+
+        Args:
+            backend: 缓存后端，默认使用内存LRU
+            ttl: 缓存条目的有效期（秒）
+            cache_sampled: 是否缓存温度大于0的请求；默认只缓存确定性请求
+            embed: 提示词向量化函数，提供时启用语义匹配
+            similarity_threshold: 语义匹配的余弦相似度阈值
+        """
+        self.backend = backend or MemoryLRUBackend()
+        self.ttl = ttl
+        self.cache_sampled = cache_sampled
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        # 最近写入条目的 (模型, 温度, 向量, 缓存键)，用于语义匹配
+        self._recent_vectors = deque(maxlen=SEMANTIC_RECENT_ENTRIES)
+        self._lock = threading.Lock()
+
+    def get(self, model: str, messages: List[Dict], temperature: float) -> Optional[str]:
+        """查询缓存，未命中时返回None"""
+        return self.backend.get(make_cache_key(model, messages, temperature))
+
+    def set(self, model: str, messages: List[Dict], temperature: float, value: str) -> None:
+        """写入缓存"""
+        self.backend.set(make_cache_key(model, messages, temperature), value, self.ttl)
+
+    def cached_or_call(self, call: Callable[[], str], model: str, messages: List[Dict],
+                       temperature: float, refresh: bool = False) -> str:
+        """
+        命中缓存时直接返回，否则调用 call 并缓存结果
+
+        Args:
+            call: 实际发送请求的函数
+            model: 模型名称
+            messages: 对话消息列表
+            temperature: 采样温度
+            refresh: 为True时跳过查询，重新请求并用新结果覆盖缓存
+
+        Returns:
+            LLM输出文本
+        """
+        key, cached, vector = self._lookup(model, messages, temperature, refresh)
+        if cached is not None:
+            return cached
+
+        result = call()
+        if key is not None:
+            self._store(key, model, temperature, vector, result)
+        return result
+
+    async def acached_or_call(self, call: Callable[[], Awaitable[str]], model: str, messages: List[Dict],
+                              temperature: float, refresh: bool = False) -> str:
+        """cached_or_call 的异步版本，call 为返回协程的请求函数，缓存策略相同"""
+        key, cached, vector = self._lookup(model, messages, temperature, refresh)
+        if cached is not None:
+            return cached
+
+        result = await call()
+        if key is not None:
+            self._store(key, model, temperature, vector, result)
+        return result
+
+    def _lookup(self, model: str, messages: List[Dict], temperature: float,
+                refresh: bool) -> Tuple[Optional[str], Optional[str], Optional[List[float]]]:
+        """
+        按缓存策略查询缓存
+
+        Returns:
+            (缓存键, 命中的结果, 提示词向量)；不参与缓存的请求缓存键为None
+        """
+        if temperature > 0 and not (self.cache_sampled or self.embed):
+            return None, None, None
+
+        key = make_cache_key(model, messages, temperature)
+        cached = None if refresh else self.backend.get(key)
+
+        vector = None
+        if cached is None and self.embed:
+            vector = self._embed_messages(messages)
+            if vector is not None and not refresh:
+                cached = self._semantic_lookup(model, temperature, vector)
+
+        if cached is not None:
+            self.hits += 1
+            logger.info(f"LLM缓存命中（命中 {self.hits} 次，未命中 {self.misses} 次）")
+        else:
+            self.misses += 1
+            logger.debug(f"LLM缓存未命中（命中 {self.hits} 次，未命中 {self.misses} 次）")
+        return key, cached, vector
+
+    def _store(self, key: str, model: str, temperature: float,
+               vector: Optional[List[float]], result: str) -> None:
+        """写入请求结果，有向量时同时登记到语义匹配的候选中"""
+        self.backend.set(key, result, self.ttl)
+        if vector is not None:
+            with self._lock:
+                self._recent_vectors.append((model, temperature, vector, key))
+
+    def _embed_messages(self, messages: List[Dict]) -> Optional[List[float]]:
+        """向量化提示词，失败时放弃语义匹配"""
+        try:
+            return self.embed("\n\n".join(message["content"] for message in messages))
+        except Exception as e:
+            logger.warning(f"提示词向量化失败，跳过语义缓存: {e}")
+            return None
+
+    def _semantic_lookup(self, model: str, temperature: float, vector: List[float]) -> Optional[str]:
+        """在最近条目中查找语义足够相近的请求结果"""
+        with self._lock:
+            candidates = [
+                (cached_vector, key) for cached_model, cached_temperature, cached_vector, key
+                in self._recent_vectors
+                if cached_model == model and cached_temperature == temperature
+            ]
+
+        best_key, best_score = None, self.similarity_threshold
+        for cached_vector, key in candidates:
+            score = _cosine_similarity(vector, cached_vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+        logger.debug(f"LLM语义缓存匹配，相似度 {best_score:.3f}")
+        return self.backend.get(best_key)
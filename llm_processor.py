@@ -1,53 +1,109 @@
+import asyncio
+from functools import partial
 import openai
 from loguru import logger
-from chunking_processor import ChunkingProcessor
-from editing_processor import EditingProcessor
-from merging_processor import MergingProcessor
+from async_scheduler import RateLimiter, RequestScheduler, call_with_retry, estimate_messages_tokens, estimate_tokens
+from batch_runner import BatchRunner, DEFAULT_POLL_INTERVAL
+from chunking_processor import ChunkingProcessor, TokenCounter
+from editing_processor import (
+    EditingProcessor, MAX_CONCURRENT_REQUESTS, build_messages, create_async_client, create_http_client,
+    format_messages
+)
+from llm_cache import LLMCache
+from merging_processor import MergingProcessor, OrderedContentMerger
+
+# 各任务的固定指令作为系统消息放在最前，动态内容放在用户消息末尾，便于命中服务端的提示词前缀缓存
+BASIC_PROOFREAD_SYSTEM = """请对用户提供的录音转文字内容进行基础校对，要求：
+1. 去除口语化表达（如"那个"、"这个"、"嗯"、"啊"等）
+2. 纠正错别字和语法错误
+3. 保持原意不变，提高文字的可读性
+4. 保持原有的段落结构
+
+请直接输出校对后的文字，不要添加任何说明。"""
+
+EXPAND_DOMAIN_SYSTEM = """请对用户提供的领域知识进行简洁扩展，要求：
+1. 补充2-3个核心专业术语
+2. 用一句话概括背景信息
+3. 总共不超过三句话
+
+请输出扩展后的领域知识（不超过三句话）。"""
+
+EXPAND_KEYWORDS_SYSTEM = """请对用户提供的关键字进行横向扩展，基于领域知识补充相关的准确关键字，要求：
+1. 根据领域知识，补充相关的专业术语和概念
+2. 扩展同类别、同层次的关键字
+3. 只输出准确、清楚的关键字，便于后续校对参考
+4. 用逗号分隔，按类别分组
+5. 不要包含错别字或近音字
+
+请输出扩展后的准确关键字（只要关键字，不要解释）。"""
 
 class LLMProcessor:
     def __init__(self, api_key, base_url, model):
+        # 同步请求共用一个连接池，编辑处理器也复用它
+        self._http = create_http_client()
+        # 重试统一由 call_with_retry/调度器在共享限流器下进行，关闭SDK自带的重试，
+        # 避免一次调用叠加成多轮请求，也让限流错误第一时间触发全局暂停
         self.client = openai.OpenAI(
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            http_client=self._http,
+            max_retries=0
         )
         self.model = model
+        # 同一账号的所有请求（各会话的同步请求、各批次的并发请求）共用限流配额
+        self.rate_limiter = RateLimiter()
+        # 校对和扩展任务的输出以确定性为目标，低温采样也缓存，反复校对相同内容时直接复用；
+        # 需要重新生成时各方法可传入 use_cache=False 跳过缓存
+        self.cache = LLMCache(cache_sampled=True)
         logger.info(f"初始化LLM处理器，模型: {model}, Base URL: {base_url}")
         
+        # 按模型的分词编码计量文本长度，分块大小尽量贴近实际的Token预算
+        self.count_tokens = TokenCounter(model)
+        
         # 初始化分块编辑相关处理器
-        self.chunking_processor = ChunkingProcessor()
-        self.editing_processor = EditingProcessor(api_key, base_url, model)
+        self.chunking_processor = ChunkingProcessor(count_tokens=self.count_tokens)
+        self.editing_processor = EditingProcessor(
+            api_key, base_url, model, http_client=self._http, rate_limiter=self.rate_limiter
+        )
         self.merging_processor = MergingProcessor()
     
-    def basic_proofread(self, text, domain_knowledge="", keywords=""):
-        """基础校对：去除口语化表达，纠正错别字，提高可读性"""
-        
-        prompt = f"""请对以下录音转文字的内容进行基础校对，要求：
-1. 去除口语化表达（如"那个"、"这个"、"嗯"、"啊"等）
-2. 纠正错别字和语法错误
-3. 保持原意不变，提高文字的可读性
-4. 保持原有的段落结构
+    def close(self):
+        """关闭HTTP连接池"""
+        self._http.close()
+        logger.info("LLM处理器连接池已关闭")
 
-{f"领域知识：{domain_knowledge}" if domain_knowledge else ""}
-{f"关键字：{keywords}" if keywords else ""}
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _chat(self, messages, temperature, use_cache=True):
+        """发送对话请求并返回输出文本，相同请求直接返回缓存结果，限流或连接错误时退避重试"""
+        def call():
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature
+            )
+            return response.choices[0].message.content.strip()
 
-原文：
-{text}
+        return self.cache.cached_or_call(
+            partial(call_with_retry, call, limiter=self.rate_limiter, token_cost=estimate_messages_tokens(messages)),
+            self.model, messages, temperature, refresh=not use_cache
+        )
 
-请直接输出校对后的文字，不要添加任何说明："""
+    def basic_proofread(self, text, domain_knowledge="", keywords="", use_cache=True):
+        """基础校对：去除口语化表达，纠正错别字，提高可读性；use_cache=False 时重新生成"""
+        
+        messages = self._build_basic_proofread_messages(text, domain_knowledge, keywords)
 
         logger.info("发送基础校对请求到LLM")
-        logger.info(f"完整提示词:\n{'-'*50}\n{prompt}\n{'-'*50}")
+        # 完整提示词仅在DEBUG级别输出，且只有该级别启用时才会格式化
+        logger.opt(lazy=True).debug("完整提示词:\n{}", lambda: f"{'-'*50}\n{format_messages(messages)}\n{'-'*50}")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
-            )
-            
-            result = response.choices[0].message.content.strip()
+            result = self._chat(messages, temperature=0.3, use_cache=use_cache)
             logger.success(f"基础校对完成，输出长度: {len(result)} 字符")
             logger.debug(f"基础校对结果预览: {result[:100]}...")
             
@@ -58,7 +114,16 @@ class LLMProcessor:
             logger.error(error_msg)
             raise Exception(error_msg)
     
-    def edit_and_organize(self, text, domain_knowledge="", keywords=""):
+    def _build_basic_proofread_messages(self, text, domain_knowledge, keywords):
+        """构建基础校对消息"""
+        return build_messages(
+            BASIC_PROOFREAD_SYSTEM,
+            f"领域知识：{domain_knowledge}" if domain_knowledge else "",
+            f"关键字：{keywords}" if keywords else "",
+            f"原文：\n{text}"
+        )
+    
+    def edit_and_organize(self, text, domain_knowledge="", keywords="", on_progress=None):
         """编辑整理：使用分块策略处理长文本"""
         
         logger.info(f"开始编辑整理，文本长度: {len(text)} 字符")
@@ -67,14 +132,10 @@ class LLMProcessor:
         if not self.chunking_processor.should_use_chunking(text):
             logger.info("文本较短，使用单块处理")
             # 直接使用编辑处理器处理单个块
-            chunk_info = {
-                'content': text,
-                'index': 1,
-                'total': 1,
-                'context': {'is_single': True}
-            }
+            chunk_info = self.chunking_processor.single_chunk(text)
             
-            result = self.editing_processor.edit_chunk(chunk_info, domain_knowledge, keywords)
+            # 单块处理与调用方在同一线程，可将流式输出实时回调给界面
+            result = self.editing_processor.edit_chunk(chunk_info, domain_knowledge, keywords, on_progress)
             return result['content']
         
         logger.info("文本较长，使用分块处理")
@@ -83,13 +144,17 @@ class LLMProcessor:
         chunks_info = self.chunking_processor.split_for_editing(text)
         logger.info(f"文本分为 {len(chunks_info)} 个块进行处理")
         
-        # 批量编辑各个块
+        # 批量编辑各个块，每块完成后按顺序增量合并内容
+        content_merger = OrderedContentMerger(self.merging_processor)
         edited_results = self.editing_processor.edit_chunks_batch(
-            chunks_info, domain_knowledge, keywords
+            chunks_info, domain_knowledge, keywords,
+            on_result=lambda result: content_merger.add(result['index'], result['content'])
         )
         
-        # 合并编辑结果
-        merged_result = self.merging_processor.merge_edited_chunks(edited_results)
+        # 合并标题、金句并整理最终内容
+        merged_result = self.merging_processor.merge_edited_chunks(
+            edited_results, merged_content=content_merger.content()
+        )
         
         # 创建处理摘要
         summary = self.merging_processor.create_content_summary(merged_result)
@@ -97,34 +162,19 @@ class LLMProcessor:
         
         return merged_result['content']
     
-    def expand_domain_knowledge(self, domain_knowledge):
-        """扩展和优化领域知识"""
+    def expand_domain_knowledge(self, domain_knowledge, use_cache=True):
+        """扩展和优化领域知识；use_cache=False 时重新生成"""
         if not domain_knowledge.strip():
             return ""
             
-        prompt = f"""请对以下领域知识进行简洁扩展，要求：
-1. 补充2-3个核心专业术语
-2. 用一句话概括背景信息
-3. 总共不超过三句话
-
-原始领域知识：
-{domain_knowledge}
-
-请输出扩展后的领域知识（不超过三句话）："""
+        messages = self._build_expand_domain_messages(domain_knowledge)
 
         logger.info("发送领域知识扩展请求到LLM")
-        logger.info(f"完整提示词:\n{'-'*50}\n{prompt}\n{'-'*50}")
+        # 完整提示词仅在DEBUG级别输出，且只有该级别启用时才会格式化
+        logger.opt(lazy=True).debug("完整提示词:\n{}", lambda: f"{'-'*50}\n{format_messages(messages)}\n{'-'*50}")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5
-            )
-            
-            result = response.choices[0].message.content.strip()
+            result = self._chat(messages, temperature=0.5, use_cache=use_cache)
             logger.success(f"领域知识扩展完成，输出长度: {len(result)} 字符")
             logger.debug(f"扩展后的领域知识预览: {result[:100]}...")
             
@@ -135,38 +185,19 @@ class LLMProcessor:
             logger.error(error_msg)
             return domain_knowledge  # 失败时返回原始内容
     
-    def expand_keywords(self, keywords, domain_knowledge=""):
-        """扩展和补全关键字"""
+    def expand_keywords(self, keywords, domain_knowledge="", use_cache=True):
+        """扩展和补全关键字；use_cache=False 时重新生成"""
         if not keywords.strip():
             return ""
             
-        prompt = f"""请对以下关键字进行横向扩展，基于领域知识补充相关的准确关键字，要求：
-1. 根据领域知识，补充相关的专业术语和概念
-2. 扩展同类别、同层次的关键字
-3. 只输出准确、清楚的关键字，便于后续校对参考
-4. 用逗号分隔，按类别分组
-5. 不要包含错别字或近音字
-
-{f"参考领域知识：{domain_knowledge}" if domain_knowledge else ""}
-
-原始关键字：
-{keywords}
-
-请输出扩展后的准确关键字（只要关键字，不要解释）："""
+        messages = self._build_expand_keywords_messages(keywords, domain_knowledge)
 
         logger.info("发送关键字扩展请求到LLM")
-        logger.info(f"完整提示词:\n{'-'*50}\n{prompt}\n{'-'*50}")
+        # 完整提示词仅在DEBUG级别输出，且只有该级别启用时才会格式化
+        logger.opt(lazy=True).debug("完整提示词:\n{}", lambda: f"{'-'*50}\n{format_messages(messages)}\n{'-'*50}")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5
-            )
-            
-            result = response.choices[0].message.content.strip()
+            result = self._chat(messages, temperature=0.5, use_cache=use_cache)
             logger.success(f"关键字扩展完成，输出长度: {len(result)} 字符")
             logger.debug(f"扩展后的关键字预览: {result[:100]}...")
             
@@ -177,6 +208,88 @@ class LLMProcessor:
             logger.error(error_msg)
             return keywords  # 失败时返回原始内容
 
+    def _build_expand_domain_messages(self, domain_knowledge):
+        """构建领域知识扩展消息"""
+        return build_messages(EXPAND_DOMAIN_SYSTEM, f"原始领域知识：\n{domain_knowledge}")
+
+    def _build_expand_keywords_messages(self, keywords, domain_knowledge):
+        """构建关键字扩展消息"""
+        return build_messages(
+            EXPAND_KEYWORDS_SYSTEM,
+            f"参考领域知识：{domain_knowledge}" if domain_knowledge else "",
+            f"原始关键字：\n{keywords}"
+        )
+
+    async def prepare_context(self, domain_knowledge, keywords, use_cache=True):
+        """
+        并发扩展领域知识和关键字
+        
+        两个扩展请求互不依赖，同时发送可将准备耗时减半。关键字扩展参考的是原始领域知识，
+        而非扩展后的结果。调用方应在会话开始时调用一次并保存结果，而不是依次调用两个同步方法。
+        
+        Args:
+            domain_knowledge: 原始领域知识
+            keywords: 原始关键字
+            use_cache: 为False时跳过缓存重新生成
+            
+        Returns:
+            (扩展后的领域知识, 扩展后的关键字)，某项扩展失败时返回其原始内容
+        """
+        scheduler = RequestScheduler(self.rate_limiter, max_concurrency=MAX_CONCURRENT_REQUESTS)
+        async with create_async_client(self.client.api_key, self.client.base_url) as aclient:
+            expanded_domain, expanded_keywords = await asyncio.gather(
+                self._aexpand_domain(aclient, scheduler, domain_knowledge, use_cache),
+                self._aexpand_keywords(aclient, scheduler, keywords, domain_knowledge, use_cache)
+            )
+        return expanded_domain, expanded_keywords
+
+    async def _achat(self, aclient, scheduler, messages, temperature, use_cache=True):
+        """异步发送对话请求，经调度器限流和重试，缓存策略与同步请求相同"""
+        async def request():
+            response = await aclient.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature
+            )
+            return response.choices[0].message.content.strip()
+
+        return await self.cache.acached_or_call(
+            partial(scheduler.submit, request, estimate_messages_tokens(messages)),
+            self.model, messages, temperature, refresh=not use_cache
+        )
+
+    async def _aexpand_domain(self, aclient, scheduler, domain_knowledge, use_cache=True):
+        """异步扩展领域知识，失败时返回原始内容"""
+        if not domain_knowledge.strip():
+            return ""
+
+        logger.info("发送领域知识扩展请求到LLM（异步）")
+        try:
+            result = await self._achat(
+                aclient, scheduler, self._build_expand_domain_messages(domain_knowledge), 0.5, use_cache
+            )
+            logger.success(f"领域知识扩展完成，输出长度: {len(result)} 字符")
+            return result
+        except Exception as e:
+            logger.error(f"领域知识扩展请求失败: {str(e)}")
+            return domain_knowledge
+
+    async def _aexpand_keywords(self, aclient, scheduler, keywords, domain_knowledge="", use_cache=True):
+        """异步扩展关键字，失败时返回原始内容"""
+        if not keywords.strip():
+            return ""
+
+        logger.info("发送关键字扩展请求到LLM（异步）")
+        try:
+            result = await self._achat(
+                aclient, scheduler, self._build_expand_keywords_messages(keywords, domain_knowledge), 0.5, use_cache
+            )
+            logger.success(f"关键字扩展完成，输出长度: {len(result)} 字符")
+            return result
+        except Exception as e:
+            logger.error(f"关键字扩展请求失败: {str(e)}")
+            return keywords
+
     def extract_golden_quotes(self, text, domain_knowledge="", keywords=""):
         """单独提取金句功能：支持长文分块提取并汇总去重"""
 
@@ -196,13 +309,13 @@ class LLMProcessor:
             chunk_info_list = self.chunking_processor.split_for_editing(text)
             all_quotes = []
 
-            for chunk in chunk_info_list:
+            # 各块并发提取，结果按块顺序返回
+            quotes_per_chunk = self.editing_processor.extract_golden_quotes_batch(
+                [chunk['content'] for chunk in chunk_info_list], domain_knowledge, keywords
+            )
+            for chunk, quotes in zip(chunk_info_list, quotes_per_chunk):
                 idx = chunk.get('index')
                 total = chunk.get('total')
-                logger.info(f"提取第 {idx}/{total} 块的金句")
-                quotes = self.editing_processor.extract_golden_quotes_from_text(
-                    chunk['content'], domain_knowledge, keywords
-                )
                 logger.info(f"第 {idx}/{total} 块提取 {len(quotes)} 条金句")
                 all_quotes.extend(quotes)
 
@@ -217,6 +330,33 @@ class LLMProcessor:
             logger.error(error_msg)
             raise Exception(error_msg)
     
+    def run_api_tasks(self, prompts, temperature=0.3):
+        """在限流调度下并发执行一组提示词，按输入顺序返回输出文本"""
+        return asyncio.run(self._run_api_tasks_async(prompts, temperature))
+
+    async def _run_api_tasks_async(self, prompts, temperature):
+        """并发执行提示词请求，限流和重试由调度器负责"""
+        scheduler = RequestScheduler(self.rate_limiter, max_concurrency=MAX_CONCURRENT_REQUESTS)
+
+        async with create_async_client(self.client.api_key, self.client.base_url) as aclient:
+            async def request(prompt):
+                response = await aclient.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=temperature
+                )
+                return response.choices[0].message.content.strip()
+
+            results = await asyncio.gather(*(
+                scheduler.submit(partial(request, prompt), estimate_tokens(prompt))
+                for prompt in prompts
+            ))
+
+        logger.info(f"批量请求完成，{scheduler.status.summary()}")
+        return results
+    
     def process_full_text(self, text, domain_knowledge="", keywords=""):
         """完整处理流程：基础校对 + 编辑整理（包含金句提取）"""
         logger.info("开始完整文本处理流程")
@@ -228,4 +368,69 @@ class LLMProcessor:
         final_result = self.edit_and_organize(basic_result, domain_knowledge, keywords)
         
         logger.success("完整文本处理流程完成")
-        return basic_result, final_result
\ No newline at end of file
+        return basic_result, final_result
+
+    def process_full_text_batch(self, docs, domain_knowledge="", keywords="", poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        通过Batch API批量完成多篇文本的完整处理流程，适合不需要实时结果的大批量任务
+        
+        Args:
+            docs: 文本列表
+            domain_knowledge: 领域知识
+            keywords: 关键字
+            poll_interval: 查询批处理状态的间隔（秒）
+            
+        Returns:
+            与输入顺序一致的 (基础校对结果, 编辑整理结果) 列表
+        """
+        logger.info(f"开始批量完整处理，共 {len(docs)} 篇文本")
+        # 批处理的上传和轮询不经过调度器，恢复SDK默认的重试
+        runner = BatchRunner(
+            self.client.with_options(max_retries=openai.DEFAULT_MAX_RETRIES), self.model, poll_interval
+        )
+        
+        # 第一步：所有文本的基础校对作为一个批处理任务
+        basic_outputs = runner.run([
+            (f"{doc_id}:basic", self._build_basic_proofread_messages(text, domain_knowledge, keywords), 0.3)
+            for doc_id, text in enumerate(docs)
+        ])
+        basic_results = [basic_outputs[f"{doc_id}:basic"] for doc_id in range(len(docs))]
+        
+        # 第二步：按与实时流程相同的策略分块，所有文本块的编辑作为第二个批处理任务
+        chunks_per_doc = []
+        for text in basic_results:
+            if self.chunking_processor.should_use_chunking(text):
+                chunks_per_doc.append(self.chunking_processor.split_for_editing(text))
+            else:
+                chunks_per_doc.append([self.chunking_processor.single_chunk(text)])
+        
+        edit_outputs = runner.run([
+            (
+                f"{doc_id}:edit:{chunk['index']}",
+                self.editing_processor._build_editing_messages(
+                    chunk['content'], chunk['index'], chunk['total'], chunk['context'],
+                    domain_knowledge, keywords
+                ),
+                0.3
+            )
+            for doc_id, chunks in enumerate(chunks_per_doc)
+            for chunk in chunks
+        ])
+        
+        # 解析各块输出并交给合并流程
+        results = []
+        for doc_id, chunks in enumerate(chunks_per_doc):
+            edited_results = [
+                self.editing_processor._build_edit_result(
+                    edit_outputs[f"{doc_id}:edit:{chunk['index']}"], chunk['index'], chunk['total']
+                )
+                for chunk in chunks
+            ]
+            if len(edited_results) == 1:
+                final_result = edited_results[0]['content']
+            else:
+                final_result = self.merging_processor.merge_edited_chunks(edited_results)['content']
+            results.append((basic_results[doc_id], final_result))
+        
+        logger.success(f"批量完整处理完成，共 {len(results)} 篇文本")
+        return results
@@ -1,7 +1,111 @@
 import re
-from typing import List, Dict, Tuple
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from itertools import chain
+from typing import Callable, List, Dict, Optional, Tuple
 from loguru import logger
 
+# 比较标题/金句时去除的字符（保留字母数字和中文）
+_CJK_CLEAN_RE = re.compile(r'[^\w\u4e00-\u9fff]')
+# 三个及以上连续换行
+_TRIPLE_NL_RE = re.compile(r'\n{3,}')
+# 精彩金句部分，截止到下一个二级标题或文末
+_QUOTES_SECTION_RE = re.compile(r'##\s*💎\s*精彩金句.*?(?=\n##|\Z)', re.DOTALL)
+# 一至三级标题前的换行
+_HEADING_BEFORE_RE = re.compile(r'\n(#{1,3}\s)')
+# 一至三级标题行及其后紧跟的正文
+_HEADING_AFTER_RE = re.compile(r'(#{1,3}\s[^\n]+)\n([^\n#])')
+# 行首的标题标记
+_HEADING_MARK_RE = re.compile(r'^#+\s*')
+
+# 判定标题包含关系时允许的最大长度差，以及视为相似的最低相似度
+_TITLE_MAX_LEN_DIFF = 3
+_TITLE_SIMILARITY = 0.85
+# 判定金句包含关系时允许的最大长度差、参与包含判断的最小长度，以及视为相似的最低相似度
+_QUOTE_MAX_LEN_DIFF = 5
+_QUOTE_MIN_CONTAIN_LEN = 11
+_QUOTE_SIMILARITY = 0.9
+
+
+def _sequence_similar(text1: str, text2: str, threshold: float) -> bool:
+    """按 SequenceMatcher 相似度判断，先用两个上界快速排除，最后才计算精确值"""
+    # 长度上界（即 real_quick_ratio），不必创建 SequenceMatcher
+    len1, len2 = len(text1), len(text2)
+    if 2 * min(len1, len2) < threshold * (len1 + len2):
+        return False
+    # 只在一方出现的字符不可能匹配，每种至少少匹配一个，用集合运算先排除
+    chars1, chars2 = set(text1), set(text2)
+    if 2 * min(len1 - len(chars1 - chars2), len2 - len(chars2 - chars1)) < threshold * (len1 + len2):
+        return False
+    matcher = SequenceMatcher(None, text1, text2)
+    return matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+
+def _min_overlap(length: int, threshold: float, max_len_diff: int, min_contain_len: int) -> int:
+    """
+    给定长度的文本与任何相似文本至少共有的字符数（按出现次数计）
+    
+    相似度为 2*匹配数/总长度，达到 threshold 时较短一方至少是较长一方的 threshold/(2-threshold) 倍，
+    共有字符至少为 length*threshold/(2-threshold)；包含关系下至少共有 length-max_len_diff 个字符。
+    """
+    overlap = int(length * threshold / (2 - threshold))
+    if length >= min_contain_len:
+        overlap = min(overlap, length - max_len_diff)
+    return max(overlap, 1)
+
+
+def _select_distinct(keys: List[Optional[str]], is_similar: Callable[[str, str], bool],
+                     min_overlap: Callable[[int], int]) -> List[bool]:
+    """
+    按顺序判断每个键是否与之前保留的键相似，返回各键是否保留
+    
+    相似的两段文本至少共有 min_overlap 个字符。把字符按在全部文本中的出现次数从少到多排序后，
+    两段文本排在最前的 长度-min_overlap+1 个字符（前缀）必有交集，
+    因此只需与前缀中含有相同字符的已保留文本比较，且前缀优先取罕见字，候选很少。
+    
+    Args:
+        keys: 用于比较的文本，None 表示总是保留且不参与比较
+        is_similar: 相似判断
+        min_overlap: 给定长度的文本与任何相似文本至少共有的字符数
+    """
+    char_freq = Counter(chain.from_iterable(key for key in keys if key))
+    kept_keys = []
+    exact = set()
+    postings = defaultdict(list)  # 前缀元素 -> 以其为前缀的已保留键的下标
+    keep = []
+    
+    for key in keys:
+        if key is None:
+            keep.append(True)
+            continue
+        if key in exact:
+            keep.append(False)
+            continue
+        
+        # 同一字符的第k次出现视为不同元素，字符多重集合的交集即可按集合计算
+        occurrences = defaultdict(int)
+        elements = []
+        for char in key:
+            occurrences[char] += 1
+            elements.append((char_freq[char], char, occurrences[char]))
+        elements.sort()
+        prefix = [(char, k) for _, char, k in elements[:len(key) - min_overlap(len(key)) + 1]]
+        
+        candidates = set()
+        for element in prefix:
+            candidates.update(postings.get(element, ()))
+        if any(is_similar(key, kept_keys[i]) for i in candidates):
+            keep.append(False)
+            continue
+        
+        for element in prefix:
+            postings[element].append(len(kept_keys))
+        kept_keys.append(key)
+        exact.add(key)
+        keep.append(True)
+    
+    return keep
+
 
 class MergingProcessor:
     """智能合并处理器，负责合并编辑后的文本块"""
@@ -10,12 +114,13 @@ class MergingProcessor:
         """初始化合并处理器"""
         logger.info("初始化智能合并处理器")
 
-    def merge_edited_chunks(self, edited_results: List[Dict]) -> Dict:
+    def merge_edited_chunks(self, edited_results: List[Dict], merged_content: Optional[str] = None) -> Dict:
         """
         合并编辑后的文本块
         
         Args:
             edited_results: 编辑结果列表，每个元素包含content、titles、golden_quotes等
+            merged_content: 编辑过程中已用 OrderedContentMerger 增量合并好的内容，提供时不再重新合并
             
         Returns:
             合并结果字典，包含最终内容、标题结构、金句等
@@ -35,7 +140,8 @@ class MergingProcessor:
         logger.info(f"开始合并 {len(edited_results)} 个编辑结果")
         
         # 合并内容
-        merged_content = self._merge_content(edited_results)
+        if merged_content is None:
+            merged_content = self._merge_content(edited_results)
         
         # 合并标题结构
         merged_titles = self._merge_titles(edited_results)
@@ -57,34 +163,20 @@ class MergingProcessor:
 
     def _merge_content(self, edited_results: List[Dict]) -> str:
         """合并文本内容"""
-        merged_parts = []
-        
+        merger = OrderedContentMerger(self)
         for i, result in enumerate(edited_results):
-            content = result['content'].strip()
-            
-            if i == 0:
-                # 第一块直接添加
-                merged_parts.append(content)
-            else:
-                # 后续块需要处理重复标题和连接
-                processed_content = self._process_subsequent_chunk(content, merged_parts[-1])
-                merged_parts.append(processed_content)
-        
-        # 用双换行连接各部分
-        merged_content = '\n\n'.join(merged_parts)
-        
-        # 清理多余的空行
-        merged_content = re.sub(r'\n{3,}', '\n\n', merged_content)
+            merger.add(i + 1, result['content'])
         
-        return merged_content.strip()
+        return merger.content()
 
     def _process_subsequent_chunk(self, content: str, previous_content: str) -> str:
         """处理后续文本块，避免重复标题"""
         lines = content.split('\n')
         processed_lines = []
         
-        # 获取前一块的最后几行，用于检测重复
-        prev_lines = previous_content.split('\n')[-3:]
+        # 获取前一块的最后几行，用于检测重复；只从末尾切分，不必拆分整个前一块
+        # 用子串而非整行匹配：重叠部分常是前一块末段中的某几句，不会单独成行
+        prev_lines = previous_content.rsplit('\n', 3)[-3:]
         prev_text = '\n'.join(prev_lines).lower()
         
         skip_lines = 0
@@ -114,7 +206,7 @@ class MergingProcessor:
         line_lower = line.lower().strip()
         
         # 忽略标题标记
-        line_clean = re.sub(r'^#+\s*', '', line_lower)
+        line_clean = _HEADING_MARK_RE.sub('', line_lower)
         
         # 如果行太短，不认为是重复
         if len(line_clean) < 5:
@@ -142,25 +234,17 @@ class MergingProcessor:
         if not titles:
             return []
         
-        unique_titles = []
-        seen_titles = set()
-        
-        for title_info in titles:
-            title = title_info['title'].strip()
-            title_clean = re.sub(r'[^\w\u4e00-\u9fff]', '', title.lower())
-            
-            # 检查是否已经存在相似标题
-            is_duplicate = False
-            for seen in seen_titles:
-                if self._titles_similar(title_clean, seen):
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_titles.append(title_info)
-                seen_titles.add(title_clean)
-        
-        return unique_titles
+        # 清洗后为空的标题不与任何标题视为相似
+        title_cleans = [
+            _CJK_CLEAN_RE.sub('', title_info['title'].strip().lower()) or None
+            for title_info in titles
+        ]
+        keep = _select_distinct(
+            title_cleans, self._titles_similar,
+            lambda length: _min_overlap(length, _TITLE_SIMILARITY, _TITLE_MAX_LEN_DIFF, 1)
+        )
+        
+        return [title_info for title_info, kept in zip(titles, keep) if kept]
 
     def _titles_similar(self, title1: str, title2: str) -> bool:
         """判断两个标题是否相似"""
@@ -176,10 +260,11 @@ class MergingProcessor:
             longer = title1 if len(title1) > len(title2) else title2
             shorter = title2 if len(title1) > len(title2) else title1
             
-            if shorter in longer and len(longer) - len(shorter) <= 3:
+            if shorter in longer and len(longer) - len(shorter) <= _TITLE_MAX_LEN_DIFF:
                 return True
         
-        return False
+        # 字序调整、个别字不同的近似标题
+        return _sequence_similar(title1, title2, _TITLE_SIMILARITY)
 
     def _merge_golden_quotes(self, edited_results: List[Dict]) -> List[str]:
         """合并金句"""
@@ -200,24 +285,18 @@ class MergingProcessor:
         if not quotes:
             return []
         
-        unique_quotes = []
+        quotes = [quote.strip() for quote in quotes]
+        quotes = [quote for quote in quotes if quote]
+        keep = _select_distinct(
+            [self._clean_quote(quote) for quote in quotes], self._cleaned_quotes_similar,
+            lambda length: _min_overlap(length, _QUOTE_SIMILARITY, _QUOTE_MAX_LEN_DIFF, _QUOTE_MIN_CONTAIN_LEN)
+        )
         
-        for quote in quotes:
-            quote = quote.strip()
-            if not quote:
-                continue
-            
-            # 检查是否已经存在相似金句
-            is_duplicate = False
-            for existing in unique_quotes:
-                if self._quotes_similar(quote, existing):
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_quotes.append(quote)
-        
-        return unique_quotes
+        return [quote for quote, kept in zip(quotes, keep) if kept]
+
+    def _clean_quote(self, quote: str) -> str:
+        """去除标点符号，得到用于比较的金句文本"""
+        return _CJK_CLEAN_RE.sub('', quote)
 
     def _quotes_similar(self, quote1: str, quote2: str) -> bool:
         """判断两个金句是否相似"""
@@ -225,29 +304,31 @@ class MergingProcessor:
             return False
         
         # 去除标点符号进行比较
-        clean1 = re.sub(r'[^\w\u4e00-\u9fff]', '', quote1)
-        clean2 = re.sub(r'[^\w\u4e00-\u9fff]', '', quote2)
-        
+        return self._cleaned_quotes_similar(self._clean_quote(quote1), self._clean_quote(quote2))
+
+    def _cleaned_quotes_similar(self, clean1: str, clean2: str) -> bool:
+        """判断两个已去除标点的金句是否相似"""
         # 完全相同
         if clean1 == clean2:
             return True
         
         # 一个包含另一个，且长度差不大
-        if len(clean1) > 10 and len(clean2) > 10:
+        if len(clean1) >= _QUOTE_MIN_CONTAIN_LEN and len(clean2) >= _QUOTE_MIN_CONTAIN_LEN:
             longer = clean1 if len(clean1) > len(clean2) else clean2
             shorter = clean2 if len(clean1) > len(clean2) else clean1
             
-            if shorter in longer and len(longer) - len(shorter) <= 5:
+            if shorter in longer and len(longer) - len(shorter) <= _QUOTE_MAX_LEN_DIFF:
                 return True
         
-        return False
+        # 标点调整、个别字不同的近似金句
+        return _sequence_similar(clean1, clean2, _QUOTE_SIMILARITY)
 
     def _optimize_merged_content(self, content: str, golden_quotes: List[str]) -> str:
         """优化合并后的内容"""
         # 确保金句部分在最后
         if golden_quotes:
             # 移除现有的金句部分
-            content = re.sub(r'##\s*💎\s*精彩金句.*?(?=\n##|\Z)', '', content, flags=re.DOTALL)
+            content = _QUOTES_SECTION_RE.sub('', content)
             
             # 在最后添加金句部分
             quotes_section = "\n\n## 💎 精彩金句\n"
@@ -257,11 +338,11 @@ class MergingProcessor:
             content = content.rstrip() + quotes_section
         
         # 清理多余的空行
-        content = re.sub(r'\n{3,}', '\n\n', content)
+        content = _TRIPLE_NL_RE.sub('\n\n', content)
         
         # 确保标题前后有适当的空行
-        content = re.sub(r'\n(#{1,3}\s)', r'\n\n\1', content)
-        content = re.sub(r'(#{1,3}\s[^\n]+)\n([^\n#])', r'\1\n\n\2', content)
+        content = _HEADING_BEFORE_RE.sub(r'\n\n\1', content)
+        content = _HEADING_AFTER_RE.sub(r'\1\n\n\2', content)
         
         return content.strip()
 
@@ -301,4 +382,49 @@ class MergingProcessor:
             if len(golden_quotes) > 3:
                 summary_parts.append(f"- ... 还有 {len(golden_quotes) - 3} 个金句")
         
-        return '\n'.join(summary_parts)
\ No newline at end of file
+        return '\n'.join(summary_parts)
+
+
+class OrderedContentMerger:
+    """按块序号增量合并编辑内容：乱序完成的块先暂存，前面的块到齐后立即并入"""
+    
+    def __init__(self, processor: MergingProcessor):
+        """
+        初始化增量合并器
+        
+        Args:
+            processor: 提供重复行处理逻辑的合并处理器
+        """
+        self.processor = processor
+        self.merged_parts = []
+        self._pending = {}
+        self._next_index = 1
+
+    def add(self, index: int, content: str):
+        """加入第 index 块（从1开始）的编辑内容"""
+        self._pending[index] = content
+        while self._next_index in self._pending:
+            self._append(self._pending.pop(self._next_index))
+            self._next_index += 1
+
+    def _append(self, content: str):
+        """并入下一块内容，后续块需要处理重复标题和连接"""
+        content = content.strip()
+        if not self.merged_parts:
+            # 第一块直接添加
+            self.merged_parts.append(content)
+        else:
+            self.merged_parts.append(self.processor._process_subsequent_chunk(content, self.merged_parts[-1]))
+
+    def content(self) -> str:
+        """返回已合并的内容"""
+        if self._pending:
+            logger.warning(f"仍有 {len(self._pending)} 个块等待前序块，未并入合并结果")
+        
+        # 用双换行连接各部分
+        merged_content = '\n\n'.join(self.merged_parts)
+        
+        # 清理多余的空行
+        merged_content = _TRIPLE_NL_RE.sub('\n\n', merged_content)
+        
+        return merged_content.strip()
@@ -0,0 +1,109 @@
+import pytest
+
+import async_scheduler
+from async_scheduler import RATE_LIMIT_COOLDOWN_SECONDS, RateLimiter
+
+
+class FakeClock:
+    """可手动推进的时钟，同时替代 time.monotonic 和 time.sleep"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(async_scheduler.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(async_scheduler.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_starts_with_full_capacity(clock):
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    assert limiter.try_acquire(100) == 0
+    assert limiter.available_request_capacity == 59
+    assert limiter.available_token_capacity == 500
+
+
+def test_wait_for_token_deficit(clock):
+    """Token不足时等待时间为缺口按每分钟上限折算的秒数"""
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    assert limiter.try_acquire(550) == 0
+    # 缺口 100 个Token，每秒补充 10 个
+    assert limiter.try_acquire(150) == pytest.approx(10)
+    # 等待未扣除容量
+    assert limiter.available_token_capacity == pytest.approx(50)
+
+
+def test_wait_for_request_deficit(clock):
+    limiter = RateLimiter(max_requests_per_minute=2, max_tokens_per_minute=600)
+    assert limiter.try_acquire(1) == 0
+    assert limiter.try_acquire(1) == 0
+    # 每 30 秒补充一次请求
+    assert limiter.try_acquire(1) == pytest.approx(30)
+    clock.now += 15
+    assert limiter.try_acquire(1) == pytest.approx(15)
+
+
+def test_refills_with_elapsed_time(clock):
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    assert limiter.try_acquire(600) == 0
+    clock.now += 9.9
+    assert limiter.try_acquire(100) > 0
+    clock.now += 0.1
+    assert limiter.try_acquire(100) == 0
+    assert limiter.available_token_capacity == pytest.approx(0)
+
+
+def test_refill_capped_at_limits(clock):
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    assert limiter.try_acquire(100) == 0
+    clock.now += 3600
+    assert limiter.try_acquire(0) == 0
+    assert limiter.available_request_capacity == pytest.approx(59)
+    assert limiter.available_token_capacity == pytest.approx(600)
+
+
+def test_wait_has_minimum(clock):
+    """缺口极小时也返回非零等待，调用方不会忙等"""
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    assert limiter.try_acquire(600) == 0
+    # 补充 0.999 个Token，缺口只需等待 0.0001 秒
+    clock.now += 0.0999
+    assert limiter.try_acquire(1) == pytest.approx(0.01)
+
+
+def test_cooldown_after_rate_limit_error(clock):
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    limiter.record_rate_limit_error()
+    assert limiter.try_acquire(1) == pytest.approx(RATE_LIMIT_COOLDOWN_SECONDS)
+    clock.now += RATE_LIMIT_COOLDOWN_SECONDS - 5
+    assert limiter.try_acquire(1) == pytest.approx(5)
+    clock.now += 5
+    assert limiter.try_acquire(1) == 0
+
+
+def test_oversized_request_capped_at_limit(clock):
+    """单个请求超过每分钟Token上限时按上限扣除，不会永远等待"""
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    assert limiter.try_acquire(10_000) == 0
+    assert limiter.available_token_capacity == 0
+    assert limiter.try_acquire(10_000) == pytest.approx(60)
+
+
+def test_acquire_sleeps_until_capacity(clock):
+    limiter = RateLimiter(max_requests_per_minute=60, max_tokens_per_minute=600)
+    limiter.acquire(600)
+    assert clock.slept == []
+    limiter.acquire(300)
+    assert sum(clock.slept) == pytest.approx(30)
+    assert limiter.available_token_capacity == pytest.approx(0)
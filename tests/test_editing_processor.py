@@ -0,0 +1,59 @@
+from editing_processor import group_by_size, parse_blocks, wrap_blocks
+
+
+def test_group_by_size_respects_item_limit():
+    """每组不超过 max_items 条，保持原顺序"""
+    assert group_by_size([1] * 5, 2, 100) == [[0, 1], [2, 3], [4]]
+
+
+def test_group_by_size_respects_char_limit():
+    """总字符数超限时另起一组，恰好等于上限时仍在同组"""
+    assert group_by_size([40, 60, 1, 50, 50], 4, 100) == [[0, 1], [2, 3], [4]]
+
+
+def test_group_by_size_oversized_item_alone():
+    """单个超限的条目独占一组"""
+    assert group_by_size([10, 500, 10], 4, 100) == [[0], [1], [2]]
+
+
+def test_group_by_size_single_item_groups():
+    """max_items 为1时逐条成组"""
+    assert group_by_size([1, 2, 3], 1, 100) == [[0], [1], [2]]
+
+
+def test_group_by_size_empty():
+    assert group_by_size([], 4, 100) == []
+
+
+def test_wrap_and_parse_round_trip():
+    """包裹后的各段可按段号原样取回"""
+    blocks = ["第一段\n含换行", "第二段", "## 标题\n- 金句"]
+    assert parse_blocks(wrap_blocks(blocks)) == {1: "第一段\n含换行", 2: "第二段", 3: "## 标题\n- 金句"}
+
+
+def test_wrap_blocks_format():
+    assert wrap_blocks(["a", "b"]) == "<<<BLOCK 1>>>\na\n<<</BLOCK 1>>>\n\n<<<BLOCK 2>>>\nb\n<<</BLOCK 2>>>"
+
+
+def test_parse_blocks_missing_block():
+    """输出中缺失的段不出现在结果中"""
+    result = "<<<BLOCK 1>>>\na\n<<</BLOCK 1>>>\n\n<<<BLOCK 3>>>\nc\n<<</BLOCK 3>>>"
+    assert parse_blocks(result) == {1: "a", 3: "c"}
+
+
+def test_parse_blocks_unclosed_block():
+    """输出被截断时，未闭合的段被丢弃，之前完整的段保留"""
+    result = "<<<BLOCK 1>>>\na\n<<</BLOCK 1>>>\n\n<<<BLOCK 2>>>\n被截断的内"
+    assert parse_blocks(result) == {1: "a"}
+
+
+def test_parse_blocks_mismatched_end_marker():
+    """结束标记的段号与开始标记不一致时不视为闭合"""
+    result = "<<<BLOCK 1>>>\na\n<<</BLOCK 2>>>"
+    assert parse_blocks(result) == {}
+
+
+def test_parse_blocks_tolerates_surrounding_text():
+    """分隔符之外的说明文字被忽略"""
+    result = "以下是结果：\n<<<BLOCK 1>>>\n  a  \n<<</BLOCK 1>>>\n完毕"
+    assert parse_blocks(result) == {1: "a"}
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+import llm_cache
+from llm_cache import LLMCache, MemoryLRUBackend
+
+MESSAGES = [{"role": "user", "content": "校对这段文字"}]
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic 替身"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_cache.time, "monotonic", fake)
+    return fake
+
+
+def _counting_call(result: str = "结果"):
+    """返回请求函数及其调用次数记录"""
+    calls = []
+
+    def call():
+        calls.append(1)
+        return f"{result}{len(calls)}"
+
+    return call, calls
+
+
+def test_lru_evicts_least_recently_used(clock):
+    backend = MemoryLRUBackend(max_entries=2)
+    backend.set("a", "1", 60)
+    backend.set("b", "2", 60)
+    assert backend.get("a") == "1"  # a 变为最近使用
+    backend.set("c", "3", 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+    assert backend.get("c") == "3"
+
+
+def test_lru_entry_expires_after_ttl(clock):
+    backend = MemoryLRUBackend()
+    backend.set("a", "1", 60)
+    clock.now += 60
+    assert backend.get("a") == "1"
+    clock.now += 0.001
+    assert backend.get("a") is None
+
+
+def test_cached_or_call_reuses_result(clock):
+    cache = LLMCache()
+    call, calls = _counting_call()
+    assert cache.cached_or_call(call, "m", MESSAGES, 0) == "结果1"
+    assert cache.cached_or_call(call, "m", MESSAGES, 0) == "结果1"
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_key_covers_model_messages_and_temperature(clock):
+    cache = LLMCache(cache_sampled=True)
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0)
+    cache.cached_or_call(call, "other", MESSAGES, 0)
+    cache.cached_or_call(call, "m", [{"role": "user", "content": "另一段"}], 0)
+    cache.cached_or_call(call, "m", MESSAGES, 0.3)
+    assert len(calls) == 4
+
+
+def test_cached_result_expires_after_ttl(clock):
+    cache = LLMCache(ttl=10)
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0)
+    clock.now += 11
+    assert cache.cached_or_call(call, "m", MESSAGES, 0) == "结果2"
+    assert len(calls) == 2
+
+
+def test_refresh_skips_lookup_and_overwrites(clock):
+    cache = LLMCache()
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0)
+    assert cache.cached_or_call(call, "m", MESSAGES, 0, refresh=True) == "结果2"
+    # 重新生成的结果覆盖旧缓存
+    assert cache.cached_or_call(call, "m", MESSAGES, 0) == "结果2"
+    assert len(calls) == 2
+
+
+def test_sampled_requests_not_cached_by_default(clock):
+    cache = LLMCache()
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0.7)
+    cache.cached_or_call(call, "m", MESSAGES, 0.7)
+    assert len(calls) == 2
+    # 不参与缓存的请求不计入命中统计
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_sampled_requests_cached_when_enabled(clock):
+    cache = LLMCache(cache_sampled=True)
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0.7)
+    cache.cached_or_call(call, "m", MESSAGES, 0.7)
+    assert len(calls) == 1
+
+
+def _fake_embed(text: str):
+    """按消息中是否包含“校对”映射到两个方向的向量"""
+    return [1.0, 0.01 * len(text)] if "校对" in text else [0.0, 1.0]
+
+
+def test_semantic_lookup_matches_similar_prompt(clock):
+    cache = LLMCache(embed=_fake_embed)
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0)
+    similar = [{"role": "user", "content": "校对这段文字。"}]
+    assert cache.cached_or_call(call, "m", similar, 0) == "结果1"
+    assert len(calls) == 1
+
+
+def test_semantic_lookup_rejects_dissimilar_prompt_and_other_model(clock):
+    cache = LLMCache(embed=_fake_embed)
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0)
+    cache.cached_or_call(call, "m", [{"role": "user", "content": "扩展关键字"}], 0)
+    cache.cached_or_call(call, "other", [{"role": "user", "content": "校对这段文字。"}], 0)
+    assert len(calls) == 3
+
+
+def test_semantic_lookup_skipped_when_embed_fails(clock):
+    def failing_embed(text):
+        raise RuntimeError("embedding service down")
+
+    cache = LLMCache(embed=failing_embed)
+    call, calls = _counting_call()
+    cache.cached_or_call(call, "m", MESSAGES, 0)
+    # 精确匹配不受影响
+    assert cache.cached_or_call(call, "m", MESSAGES, 0) == "结果1"
+    assert len(calls) == 1
+
+
+def test_acached_or_call_shares_cache_with_sync(clock):
+    cache = LLMCache()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "异步结果"
+
+    assert asyncio.run(cache.acached_or_call(call, "m", MESSAGES, 0)) == "异步结果"
+    assert asyncio.run(cache.acached_or_call(call, "m", MESSAGES, 0)) == "异步结果"
+    assert cache.cached_or_call(lambda: "不应调用", "m", MESSAGES, 0) == "异步结果"
+    assert len(calls) == 1
+
+
+def test_file_backend_round_trip(tmp_path):
+    backend = llm_cache.FileBackend(str(tmp_path))
+    backend.set("k", "值", 60)
+    assert backend.get("k") == "值"
+    assert backend.get("missing") is None
+    backend.set("expired", "旧值", -1)
+    assert backend.get("expired") is None
@@ -0,0 +1,74 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+import merging_processor
+from merging_processor import MergingProcessor, _CJK_CLEAN_RE, _sequence_similar
+
+# 随机用例使用小字母表，使相似、包含、重复的文本足够常见
+ALPHABET = '天地人和春夏秋。，ab'
+
+
+def _random_variants(rng: random.Random, count: int) -> list:
+    """从几段基础文本随机改字、删字，生成一组互相近似的文本"""
+    bases = [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 60))) for _ in range(4)]
+    texts = []
+    for _ in range(count):
+        chars = list(rng.choice(bases))
+        for _ in range(rng.randint(0, 3)):
+            if chars:
+                chars[rng.randrange(len(chars))] = rng.choice(ALPHABET)
+        if chars and rng.random() < 0.3:
+            del chars[rng.randrange(len(chars))]
+        texts.append(''.join(chars))
+    return texts
+
+
+def _brute_force_quotes(processor: MergingProcessor, quotes: list) -> list:
+    """逐一与所有已保留金句比较的去重结果"""
+    kept = []
+    for quote in quotes:
+        quote = quote.strip()
+        if quote and not any(processor._quotes_similar(quote, other) for other in kept):
+            kept.append(quote)
+    return kept
+
+
+def _brute_force_titles(processor: MergingProcessor, titles: list) -> list:
+    """逐一与所有已保留标题比较的去重结果"""
+    kept, kept_cleans = [], []
+    for title_info in titles:
+        clean = _CJK_CLEAN_RE.sub('', title_info['title'].strip().lower())
+        if not any(processor._titles_similar(clean, other) for other in kept_cleans):
+            kept.append(title_info)
+            kept_cleans.append(clean)
+    return kept
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.7, 0.85, 0.9, 0.95])
+def test_sequence_similar_matches_ratio(threshold):
+    """快速上界只排除，不改变按 SequenceMatcher.ratio 的判断结果"""
+    rng = random.Random(threshold)
+    for _ in range(2000):
+        text1, text2 = _random_variants(rng, 2)
+        expected = SequenceMatcher(None, text1, text2).ratio() >= threshold
+        assert _sequence_similar(text1, text2, threshold) == expected, (text1, text2)
+
+
+@pytest.mark.parametrize('similarity, max_len_diff', [(0.85, 3), (0.9, 5), (0.7, 8), (0.95, 1)])
+def test_deduplicate_matches_brute_force(monkeypatch, similarity, max_len_diff):
+    """前缀过滤的候选索引与两两比较的去重结果一致，包括调整阈值后"""
+    monkeypatch.setattr(merging_processor, '_TITLE_SIMILARITY', similarity)
+    monkeypatch.setattr(merging_processor, '_TITLE_MAX_LEN_DIFF', max_len_diff)
+    monkeypatch.setattr(merging_processor, '_QUOTE_SIMILARITY', similarity)
+    monkeypatch.setattr(merging_processor, '_QUOTE_MAX_LEN_DIFF', max_len_diff)
+    processor = MergingProcessor()
+    rng = random.Random(f'{similarity}-{max_len_diff}')
+
+    for _ in range(600):
+        quotes = _random_variants(rng, rng.randint(0, 25))
+        assert processor._deduplicate_quotes(quotes) == _brute_force_quotes(processor, quotes), quotes
+
+        titles = [{'title': text, 'level': 2} for text in quotes]
+        assert processor._deduplicate_titles(titles) == _brute_force_titles(processor, titles), quotes
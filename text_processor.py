@@ -2,6 +2,39 @@ import re
 from typing import List
 from loguru import logger
 
+# 以句末标点结尾的句子，或末尾不带标点的剩余文本
+_SENT_SPLIT_RE = re.compile(r'[^。！？.!?]*[。！？.!?]|[^。！？.!?]+\Z')
+# 句末标点集合，用于单字符判断
+_SENT_END = frozenset('。！？.!?')
+# 句末标点（连续的标点视为一个边界）
+_SENT_BOUNDARY_RE = re.compile(r'[。！？.!?]+')
+# 两个及以上连续空格（制表符已先替换为空格）
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+# 三个及以上连续换行
+_TRIPLE_NL_RE = re.compile(r'\n{3,}')
+# 段落分隔（空行）
+_PARA_RE = re.compile(r'\n\s*\n')
+# 合并结果时，取前一块结尾的字符数和当前块开头的行数检测重复
+_OVERLAP_TAIL_CHARS = 200
+_OVERLAP_CHECK_LINES = 5
+
+
+def clean_whitespace(text: str) -> str:
+    """标准化换行符和空白字符，保留段落分隔（最多一个空行）"""
+    # 标准化换行符（先替换 \r\n，避免被当作两个换行）
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    
+    # 清理多余的空白，但保留段落分隔；只在确有需要替换的位置产生替换
+    if '\t' in text:
+        text = text.replace('\t', ' ')
+    text = _MULTI_SPACE_RE.sub(' ', text)  # 多个空格 -> 单个空格
+    # 连续空白已压缩为单个空格，行首/行尾空白用字符串替换即可
+    text = text.replace('\n ', '\n').replace(' \n', '\n')
+    text = _TRIPLE_NL_RE.sub('\n\n', text)  # 多个换行 -> 双换行
+    
+    return text.strip()
+
 
 class TextProcessor:
     """文本处理器，负责文本分割和结果合并"""
@@ -78,15 +111,16 @@ class TextProcessor:
                 # 第一块直接添加
                 merged_parts.append(result)
             else:
-                # 后续块需要处理重叠
-                processed_result = self._process_overlap(result, merged_parts[-1])
+                # 后续块需要处理重叠，前一块的结尾只取一次并转为小写
+                prev_tail = merged_parts[-1][-_OVERLAP_TAIL_CHARS:].lower()
+                processed_result = self._process_overlap(result, prev_tail)
                 merged_parts.append(processed_result)
         
         # 用双换行连接各部分
         merged_text = '\n\n'.join(merged_parts)
         
         # 清理多余的空行
-        merged_text = re.sub(r'\n{3,}', '\n\n', merged_text)
+        merged_text = _TRIPLE_NL_RE.sub('\n\n', merged_text)
         
         logger.success(f"合并完成，最终文本长度: {len(merged_text)} 字符")
         return merged_text.strip()
@@ -94,7 +128,7 @@ class TextProcessor:
     def _split_by_paragraphs(self, text: str) -> List[str]:
         """按段落分割文本"""
         # 按双换行符分割段落
-        paragraphs = re.split(r'\n\s*\n', text)
+        paragraphs = _PARA_RE.split(text)
         paragraphs = [p.strip() for p in paragraphs if p.strip()]
         
         # 如果段落过长，进一步分割
@@ -111,48 +145,67 @@ class TextProcessor:
 
     def _split_long_paragraph(self, paragraph: str) -> List[str]:
         """分割过长的段落"""
-        sentence_endings = ['。', '！', '？', '.', '!', '?']
         sentences = []
-        current = ""
+        pieces = []
+        current_len = 0
         
-        for char in paragraph:
-            current += char
-            if char in sentence_endings and len(current) > 100:
-                sentences.append(current.strip())
-                current = ""
+        # 逐句累积，累计长度超过100且恰好在句末时切分
+        for sentence in _SENT_SPLIT_RE.findall(paragraph):
+            pieces.append(sentence)
+            current_len += len(sentence)
+            if current_len > 100 and sentence[-1] in _SENT_END:
+                sentences.append(''.join(pieces).strip())
+                pieces = []
+                current_len = 0
         
-        if current.strip():
-            sentences.append(current.strip())
+        current = ''.join(pieces).strip()
+        if current:
+            sentences.append(current)
         
         return sentences
 
     def _combine_paragraphs_to_chunks(self, paragraphs: List[str]) -> List[str]:
         """将段落组合成合适大小的块"""
         chunks = []
-        current_chunk = ""
+        # 当前块以片段列表累积，只在块完成时拼接一次
+        current_pieces = []
+        current_len = 0
+        # 同步维护当前块末尾至多 2 倍重叠长度的文本，重叠只需在这段尾部中计算
+        tail_window = max(self.overlap_size, 0) * 2
+        tail = ""
         
         for para in paragraphs:
+            para_len = len(para)
             # 检查添加当前段落是否会超出大小限制
-            if len(current_chunk) + len(para) + 2 <= self.chunk_size:
-                if current_chunk:
-                    current_chunk += "\n\n" + para
-                else:
-                    current_chunk = para
+            if current_len + para_len + 2 <= self.chunk_size:
+                if current_pieces:
+                    current_len += 2
+                    if tail_window:
+                        tail = (tail + "\n\n" + para[-tail_window:])[-tail_window:]
+                elif tail_window:
+                    tail = para[-tail_window:]
+                current_pieces.append(para)
+                current_len += para_len
             else:
                 # 当前块已满，保存并开始新块
-                if current_chunk:
-                    chunks.append(current_chunk)
+                if current_pieces:
+                    chunks.append("\n\n".join(current_pieces))
                 
                 # 处理重叠
                 if chunks and self.overlap_size > 0:
-                    overlap_text = self._get_overlap_text(current_chunk, self.overlap_size)
-                    current_chunk = overlap_text + "\n\n" + para
+                    overlap_text = self._get_overlap_text(tail, self.overlap_size)
+                    current_pieces = [overlap_text, para]
+                    current_len = len(overlap_text) + 2 + para_len
+                    tail = (overlap_text + "\n\n" + para[-tail_window:])[-tail_window:]
                 else:
-                    current_chunk = para
+                    current_pieces = [para]
+                    current_len = para_len
+                    if tail_window:
+                        tail = para[-tail_window:]
         
         # 添加最后一个块
-        if current_chunk:
-            chunks.append(current_chunk)
+        if current_pieces:
+            chunks.append("\n\n".join(current_pieces))
         
         return chunks
 
@@ -163,54 +216,46 @@ class TextProcessor:
         
         # 尝试在句子边界获取重叠
         overlap_text = text[-overlap_size:]
-        sentence_endings = ['。', '！', '？', '.', '!', '?']
         
         # 寻找最近的句子结束点
-        for i, char in enumerate(overlap_text):
-            if char in sentence_endings:
-                return overlap_text[i+1:].strip()
+        match = _SENT_BOUNDARY_RE.search(overlap_text)
+        if match:
+            return overlap_text[match.start()+1:].strip()
         
         return overlap_text
 
-    def _process_overlap(self, current_result: str, previous_result: str) -> str:
-        """处理重叠部分，避免重复内容"""
-        if not previous_result or not current_result:
-            return current_result
+    def _process_overlap(self, current_result: str, prev_tail: str) -> str:
+        """
+        处理重叠部分，避免重复内容
         
-        # 获取前一个结果的最后部分用于检测重复
-        prev_tail = previous_result[-min(200, len(previous_result)):].lower()
-        current_lines = current_result.split('\n')
-        processed_lines = []
+        Args:
+            current_result: 当前块的结果
+            prev_tail: 前一块结果的结尾（已转为小写）
+            
+        Returns:
+            去掉开头重复行后的结果
+        """
+        if not prev_tail or not current_result:
+            return current_result
         
-        # 检查前几行是否与前一个结果重复
+        # 只检查前几行是否与前一个结果重复，不切分整个结果
         skip_count = 0
-        for i, line in enumerate(current_lines[:5]):  # 只检查前5行
+        skip_chars = 0
+        for line in current_result.split('\n', _OVERLAP_CHECK_LINES)[:_OVERLAP_CHECK_LINES]:
             line_stripped = line.strip()
             if line_stripped and line_stripped.lower() in prev_tail:
-                skip_count = i + 1
+                skip_count += 1
+                skip_chars += len(line) + 1
             else:
                 break
         
         # 跳过重复的行
         if skip_count > 0:
-            processed_lines = current_lines[skip_count:]
             logger.debug(f"跳过了 {skip_count} 行重复内容")
-        else:
-            processed_lines = current_lines
-        
-        return '\n'.join(processed_lines).strip()
+            return current_result[skip_chars:].strip()
+        return current_result.strip()
 
     def _clean_text(self, text: str) -> str:
         """清理文本，标准化空白字符"""
-        # 标准化换行符
-        text = re.sub(r'\r\n', '\n', text)
-        text = re.sub(r'\r', '\n', text)
-        
-        # 清理多余的空白，但保留段落分隔
-        text = re.sub(r'[ \t]+', ' ', text)  # 多个空格/制表符 -> 单个空格
-        text = re.sub(r'\n[ \t]+', '\n', text)  # 行首空白
-        text = re.sub(r'[ \t]+\n', '\n', text)  # 行尾空白
-        text = re.sub(r'\n{3,}', '\n\n', text)  # 多个换行 -> 双换行
-        
-        return text.strip()
+        return clean_whitespace(text)
 